@@ -1,21 +1,90 @@
-import gradio as gr
+# Settings from .env must be in the environment before the imports below read them (at import time)
+from dotenv import load_dotenv
+load_dotenv()
 # from new_v4 import GeminiOutlineConverter
-from new_v4 import GeminiContentPreservingConverter # Changed this line
+from new_v4 import output_version, OUTLINE_ENGINE
+from new_v4 import EVENT_STAGE, EVENT_EXTRACTED, EVENT_CHUNKED, EVENT_CHUNK_DONE, EVENT_CACHE, EVENT_PRESERVATION, EVENT_RETRY, EVENT_WARNING, EVENT_ERROR, EVENT_METRICS, EVENT_QUOTA_WAIT
+from converter_pool import get_converter, configure_pool
+from output_store import OutputStore
+from model_backends import load_backends
+from telemetry import CONTENT_TYPE, render_metrics, stage_span
+import argparse
 import os
-import glob
-from dotenv import load_dotenv
-import io
-import sys
-from contextlib import redirect_stdout, redirect_stderr
+import queue
+import threading
+import time
 
-load_dotenv()
+# Importing this module only loads .env (without overriding variables already set): gradio is only
+# loaded by create_app(), and output cleanup and the server start happen in main().
 OUTPUT_FOLDER = "generated_docs"
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 MANUALLY_ENTERED_API_KEY = None
-
-# Clean old files
-for f in glob.glob(f"{OUTPUT_FOLDER}/*.docx"):
-    os.remove(f)
+PROGRESS_REFRESH_SECONDS = 1.0 # How often the status box refreshes while a conversion runs
+PREVIEW_MAX_CHARS = 20000 # Only the tail of very long outlines is streamed to the preview box
+METRICS_ENABLED = os.getenv("PRETTYNOTES_METRICS", "1") != "0" # Serve Prometheus metrics at /metrics next to the UI
+
+def parse_queue_settings(argv=None):
+    """Queue/concurrency settings from the command line, falling back to environment variables."""
+    parser = argparse.ArgumentParser(description="PrettyNotes web app")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("PRETTYNOTES_CONCURRENCY", "4")),
+                        help="Conversions that run at the same time (Gradio default_concurrency_limit)")
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("PRETTYNOTES_MAX_QUEUE", "32")),
+                        help="Requests allowed to wait in the queue before new ones are turned away")
+    parser.add_argument("--per-user-limit", type=int, default=int(os.getenv("PRETTYNOTES_PER_USER_LIMIT", "1")),
+                        help="Conversions a single user may have running at once")
+    parser.add_argument("--max-gemini-calls", type=int, default=int(os.getenv("PRETTYNOTES_MAX_GEMINI_CALLS", "8")),
+                        help="Gemini requests in flight across all conversions (keep within your API quota)")
+    parser.add_argument("--trust-proxy", action="store_true", default=os.getenv("PRETTYNOTES_TRUST_PROXY", "0") != "0",
+                        help="Identify users by the first X-Forwarded-For address (only behind a proxy that sets it) instead of their browser session")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+QUEUE_SETTINGS = parse_queue_settings([]) # Environment defaults; main() re-parses with the real command line
+
+# Running conversions per user, to enforce --per-user-limit
+_active_by_user = {}
+_active_by_user_lock = threading.Lock()
+
+def _user_id(request):
+    """Who a request counts against for --per-user-limit and fair Gemini scheduling.
+
+    The browser session by default: client addresses are shared by everyone behind a reverse proxy or NAT.
+    """
+    if QUEUE_SETTINGS.trust_proxy:
+        forwarded = request.headers.get("x-forwarded-for", "")
+        if forwarded.split(",")[0].strip():
+            return forwarded.split(",")[0].strip()
+    if request.session_hash:
+        return request.session_hash
+    if request.client and request.client.host:
+        return request.client.host
+    return None
+
+def _acquire_user_slot(user_id):
+    if user_id is None: # Called outside a Gradio request (e.g. from a script)
+        return True
+    with _active_by_user_lock:
+        if _active_by_user.get(user_id, 0) >= QUEUE_SETTINGS.per_user_limit:
+            return False
+        _active_by_user[user_id] = _active_by_user.get(user_id, 0) + 1
+        return True
+
+def _release_user_slot(user_id):
+    if user_id is None:
+        return
+    with _active_by_user_lock:
+        _active_by_user[user_id] -= 1
+        if not _active_by_user[user_id]:
+            del _active_by_user[user_id]
+
+# Finished outputs are kept (with TTL and capacity limits) so re-uploads of the same PDF are instant
+_output_store = None
+
+def get_output_store():
+    """The DOCX output store, created on first use."""
+    global _output_store
+    if _output_store is None:
+        _output_store = OutputStore(OUTPUT_FOLDER)
+    return _output_store
 
 # OLD FUNCTION WITH LIMITED FUNCTINALITY
 # def convert_pdf_to_outline_simplified(pdf_path):
@@ -61,65 +130,207 @@ for f in glob.glob(f"{OUTPUT_FOLDER}/*.docx"):
 
 #     return "❌ Failed to generate output file.", None
 
+def _excerpt(text, limit=80):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def summarize_events(events):
+    """Build the status box details from one request's progress events."""
+    preservation_lines = []
+    error_lines = []
+    local_chunks = sum(1 for e in events if e['type'] == EVENT_CHUNK_DONE and e.get('engine') == 'local')
+    if local_chunks:
+        preservation_lines.append(f"Local outliner: {local_chunks} chunk(s) outlined without Gemini")
+    model_chunks = {}
+    for event in events:
+        if event['type'] == EVENT_CHUNK_DONE and event.get('engine') not in (None, 'local', 'raw'):
+            model_chunks[event['engine']] = model_chunks.get(event['engine'], 0) + 1
+    if set(model_chunks) - {'gemini'}:
+        preservation_lines.append("Chunks by model: " + ", ".join(f"{name} {count}" for name, count in sorted(model_chunks.items())))
+    for event in sorted(events, key=lambda e: e.get('chunk', 0)):
+        chunk_label = f"Chunk {event['chunk']}: " if 'chunk' in event else ""
+        if event['type'] == EVENT_PRESERVATION:
+            verdict = "passed" if event['passed'] else "FAILED strict check (content was corrected/reformatted)"
+            preservation_lines.append(f"{chunk_label}{event['ratio']:.2%} of original text preserved, {verdict}")
+            if not event['passed']:
+                preservation_lines.extend(f"    missing: \"{_excerpt(span)}\"" for span in event.get('missing', []))
+        elif event['type'] == EVENT_RETRY:
+            outcome = "passed" if event['outcome'] == 'passed' else "still failing, used the raw extracted text"
+            preservation_lines.append(f"{chunk_label}retried {event['attempts']}x in {event['seconds']:.1f}s, {outcome}")
+        elif event['type'] == EVENT_CACHE:
+            preservation_lines.append(f"Outline cache: {event['hits']} hits, {event['misses']} misses")
+        elif event['type'] == EVENT_CHUNKED:
+            preservation_lines.append(f"Chunking: {event['total_chunks']} chunks, {event['fill_ratio']:.0%} of the token budget used on average")
+        elif event['type'] == EVENT_METRICS and len(event.get('backends', {})) > 1:
+            for name, backend in event['backends'].items():
+                p50 = f"p50 {backend['p50_seconds']:.1f}s" if backend['p50_seconds'] is not None else "no calls yet"
+                preservation_lines.append(f"Backend {name}: {p50}, {backend['calls']} calls, {backend['failures']} failed, circuit {backend['breaker']}")
+        elif event['type'] in (EVENT_WARNING, EVENT_ERROR):
+            error_lines.append(f"{chunk_label}{event['message']}")
+
+    details = ""
+    if preservation_lines:
+        details += "📊 Content Preservation Results:\n" + "\n".join(preservation_lines) + "\n"
+    if error_lines:
+        details += "⚠️ Errors:\n" + "\n".join(error_lines) + "\n"
+    return details
+
+class ConversionProgress:
+    """Tracks one request's progress events for the streaming status box and outline preview."""
+    def __init__(self):
+        self.events = []
+        self.total_pages = 0
+        self.chunks_done = 0
+        self.total_chunks = None # Unknown until the last page has been extracted
+        self.stage = 'starting'
+        self.chunk_outlines = {}
+        self.chunk_pages = {}
+        self.quota_wait_until = 0.0 # Monotonic time the latest chunk queued for Gemini quota expects its turn
+
+    def add(self, event):
+        self.events.append(event)
+        if event['type'] == EVENT_STAGE:
+            self.stage = event['stage']
+            self.total_pages = event.get('total_pages', self.total_pages)
+        elif event['type'] == EVENT_EXTRACTED:
+            self.total_pages = event['pages']
+        elif event['type'] in (EVENT_CHUNKED, EVENT_CACHE):
+            self.total_chunks = event['total_chunks']
+        elif event['type'] == EVENT_CHUNK_DONE:
+            self.chunks_done += 1
+            self.total_chunks = event['total_chunks'] or self.total_chunks
+            self.chunk_outlines[event['chunk']] = event['outline'] or ""
+            self.chunk_pages[event['chunk']] = event['page'] or 0
+        elif event['type'] == EVENT_QUOTA_WAIT:
+            self.quota_wait_until = max(self.quota_wait_until, time.monotonic() + event['seconds'])
+
+    def pages_done(self):
+        # Page on which the leading run of finished chunks ends; chunks finish out of order
+        page = 0
+        chunk = 1
+        while chunk in self.chunk_pages:
+            page = self.chunk_pages[chunk]
+            chunk += 1
+        return min(self.total_pages, page)
+
+    def status(self, elapsed):
+        line = f"⏳ {self.stage.capitalize()}... {elapsed:.0f}s elapsed"
+        if self.chunks_done:
+            pages_done = self.pages_done()
+            line += f"\n📄 Chunk {self.chunks_done}/{self.total_chunks or '?'} · ~page {pages_done}/{self.total_pages}"
+            if elapsed > 0:
+                line += f" · {pages_done / elapsed:.2f} pages/s"
+        quota_wait = self.quota_wait_until - time.monotonic()
+        if quota_wait >= 1:
+            line += f"\n🚦 Waiting for Gemini quota: ~{quota_wait:.0f}s"
+        return line
+
+    def preview(self):
+        """Outline for the leading run of finished chunks, i.e. everything produced so far in document order."""
+        parts = []
+        chunk = 1
+        while chunk in self.chunk_outlines:
+            if self.chunk_outlines[chunk]:
+                parts.append(self.chunk_outlines[chunk])
+            chunk += 1
+        preview = "\n".join(parts)
+        if len(preview) > PREVIEW_MAX_CHARS:
+            preview = "...\n" + preview[-PREVIEW_MAX_CHARS:]
+        return preview
+
 # updated function with more functionality (detailed status log)
-def convert_pdf_to_outline_simplified(pdf_path):
+def convert_pdf_to_outline_simplified(pdf_path, user_id=None):
+    """Generator: streams (status, outline preview, DOCX) updates while the PDF is converted."""
     if not pdf_path:
-        return "❌ No PDF file provided.", None
+        yield "❌ No PDF file provided.", "", None
+        return
+
+    if not _acquire_user_slot(user_id):
+        yield f"🚦 You already have {QUEUE_SETTINGS.per_user_limit} conversion(s) running. Please wait for it to finish.", "", None
+        return
+    try:
+        yield from _convert_pdf(pdf_path, user_id)
+    finally:
+        _release_user_slot(user_id)
+
+def _convert_pdf(pdf_path, user_id=None):
+    yield "🕒 Your turn! Starting conversion...", "", None
 
     current_api_key = os.getenv("GEMINI_API_KEY", "").strip()
 
-    if not current_api_key:
-        return "🔐 Gemini API key not found in environment variables.", None
+    # Same condition the converter checks: other model backends can stand in for Gemini
+    if not current_api_key and OUTLINE_ENGINE != 'local' and not load_backends():
+        yield "🔐 Gemini API key not found in environment variables (and no other model backend is configured).", "", None
+        return
+
+    # Gradio has already received the file; this is taking it in: hashing it and looking for a stored output
+    with stage_span('upload', bytes=os.path.getsize(pdf_path)):
+        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        output_name = f"{base_name}_styled_outline.docx"
+        output_store = get_output_store()
+        store_key = OutputStore.make_key(pdf_path, output_version())
+        stored_path = output_store.get(store_key, output_name)
+    if stored_path:
+        yield "✅ Successfully converted! (served from previously converted output)", "", stored_path
+        return
 
-    # Capture all print outputs
-    stdout_capture = io.StringIO()
-    stderr_capture = io.StringIO()
-    
     try:
-        with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
-            converter = GeminiContentPreservingConverter(api_key=current_api_key)
-            
-            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-            output_path = os.path.join(OUTPUT_FOLDER, f"{base_name}_styled_outline.docx")
-            
-            result_path = converter.process_file(pdf_path, output_path)
-        
-        # Get captured outputs
-        stdout_output = stdout_capture.getvalue()
-        stderr_output = stderr_capture.getvalue()
-        
-        # Filter to show only content preservation messages
-        preservation_logs = ""
-        if stdout_output:
-            lines = stdout_output.split('\n')
-            preservation_lines = [line for line in lines if 
-                                'Content preservation check:' in line or 
-                                'outline passed content preservation check' in line or
-                                'outline FAILED strict content preservation check' in line]
-            if preservation_lines:
-                preservation_logs += f"📊 Content Preservation Results:\n" + "\n".join(preservation_lines) + "\n"
-        
-        if stderr_output:
-            preservation_logs += f"⚠️ Errors:\n{stderr_output}\n"
-            
+        # Shared per process; only the first request pays for client setup
+        converter = get_converter(current_api_key)
     except Exception as e:
-        return f"❌ Failed to initialize Gemini client: {e}", None
+        yield f"❌ Failed to initialize Gemini client: {e}", "", None
+        return
 
-    if result_path and os.path.exists(result_path):
+    # Events for this request only; the converter's worker threads put, this generator drains
+    event_queue = queue.Queue()
+    outcome = {}
+    output_path = output_store.output_path(store_key, output_name)
+
+    def run_conversion():
         try:
-            from docx import Document
-            doc = Document(result_path)
-            if len(doc.paragraphs) < 5 and any("no outlines" in p.text.lower() for p in doc.paragraphs):
-                status_message = f"📄 Processed, but no meaningful outline generated.\n\n{preservation_logs}"
-                return status_message, result_path
-        except:
-            pass
-        
-        status_message = f"✅ Successfully converted!\n\n{preservation_logs}"
-        return status_message, result_path
+            outcome['result'] = converter.process_file(pdf_path, output_path, progress_callback=event_queue.put, user_id=user_id)
+        except Exception as e:
+            outcome['error'] = e
 
+    worker = threading.Thread(target=run_conversion, daemon=True)
+    worker.start()
+    progress = ConversionProgress()
+    start_time = time.monotonic()
+
+    while worker.is_alive() or not event_queue.empty():
+        try:
+            progress.add(event_queue.get(timeout=PROGRESS_REFRESH_SECONDS))
+            while True:
+                progress.add(event_queue.get_nowait())
+        except queue.Empty:
+            pass
+        yield progress.status(time.monotonic() - start_time), progress.preview(), None
+
+    preservation_logs = summarize_events(progress.events)
+    elapsed_line = f"⏱️ Finished in {time.monotonic() - start_time:.1f}s\n"
+    if 'error' in outcome:
+        output_store.discard(output_path)
+        yield f"⚠️ Error during processing: {outcome['error']}\n\n{preservation_logs}", progress.preview(), None
+        return
+    result = outcome['result']
+
+    if result.output_path:
+        if result.empty_outline:
+            # Not published, so the next upload of this PDF gets another try
+            status_message = f"📄 Processed, but no meaningful outline generated.\n{elapsed_line}\n{preservation_logs}"
+            yield status_message, progress.preview(), output_store.detach(result.output_path)
+            return
+
+        final_path = output_store.publish(store_key, result.output_path)
+        output_store.prune()
+        status_message = f"✅ Successfully converted!\n{elapsed_line}\n{preservation_logs}"
+        yield status_message, progress.preview(), final_path
+        return
+
+    output_store.discard(output_path)
     status_message = f"❌ Failed to generate output file.\n\n{preservation_logs}"
-    return status_message, None
+    yield status_message, progress.preview(), None
 
 # 🌟 Enhanced Gradio UI with gr.Blocks
 # with gr.Blocks(title="PrettyNotes ✨") as demo:
@@ -260,100 +471,148 @@ def convert_pdf_to_outline_simplified(pdf_path):
 # demo.launch()
 
 # updated code with forced color and tweaks for white mode
-with gr.Blocks(
-    css="""
-    body {
-      background-image: url('https://images.pexels.com/photos/7135037/pexels-photo-7135037.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1');
-      background-size: cover;
-      background-position: center;
-      background-attachment: fixed;
-      font-family: 'Segoe UI', sans-serif;
-    }
-
-    body, body * {
-      color: white;
-    }
-
-    .gradio-container,
-    .gradio-container *,
-    .gr-markdown,
-    .gr-markdown *,
-    .gr-button,
-    .gr-textbox,
-    .gr-file,
-    label,
-    h1, h2, h3, h4, h5, h6,
-    p, span, div {
-      color: white;
-    }
-
-    @media (prefers-color-scheme: dark) {
-      body, body * {
-        color: white !important;
-      }
-    }
-
-    @media (prefers-color-scheme: light) {
-      .gr-button,
-      .gr-textbox,
-      .gr-file,
-      input,
-      button,
-      textarea,
-      label,
-      h1, h2, h3, h4, h5, h6,
-      p, span, div {
-        color: black !important;
-      }
-      #top-markdown {
-        background-color: rgba(255, 255, 255, 0.8);
-        border-radius: 10px;
-        padding: 10px;
-      }
-      .app-row, .app-column {
-        # border: 1px solid lightgray;
-        background-color: rgba(255, 255, 255, 0.8);
-        border-radius: 10px;
-        padding: 10px;
-      }
-    }
-    """,
-    title="PrettyNotes ✨"
-) as demo:
-    gr.Markdown("""
-    # ✨ PrettyNotes
-    Transform any PDF into a **structured, editable DOCX outline** in seconds.
+def create_app():
+    """Build the Gradio UI (imports gradio lazily)."""
+    import gradio as gr
+
+    def convert(pdf_path, request: gr.Request):
+        yield from convert_pdf_to_outline_simplified(pdf_path, user_id=_user_id(request))
+
+    with gr.Blocks(
+        css="""
+        body {
+          background-image: url('https://images.pexels.com/photos/7135037/pexels-photo-7135037.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1');
+          background-size: cover;
+          background-position: center;
+          background-attachment: fixed;
+          font-family: 'Segoe UI', sans-serif;
+        }
+
+        body, body * {
+          color: white;
+        }
+
+        .gradio-container,
+        .gradio-container *,
+        .gr-markdown,
+        .gr-markdown *,
+        .gr-button,
+        .gr-textbox,
+        .gr-file,
+        label,
+        h1, h2, h3, h4, h5, h6,
+        p, span, div {
+          color: white;
+        }
+
+        @media (prefers-color-scheme: dark) {
+          body, body * {
+            color: white !important;
+          }
+        }
+
+        @media (prefers-color-scheme: light) {
+          .gr-button,
+          .gr-textbox,
+          .gr-file,
+          input,
+          button,
+          textarea,
+          label,
+          h1, h2, h3, h4, h5, h6,
+          p, span, div {
+            color: black !important;
+          }
+          #top-markdown {
+            background-color: rgba(255, 255, 255, 0.8);
+            border-radius: 10px;
+            padding: 10px;
+          }
+          .app-row, .app-column {
+            # border: 1px solid lightgray;
+            background-color: rgba(255, 255, 255, 0.8);
+            border-radius: 10px;
+            padding: 10px;
+          }
+        }
+        """,
+        title="PrettyNotes ✨"
+    ) as demo:
+        gr.Markdown("""
+        # ✨ PrettyNotes
+        Transform any PDF into a **structured, editable DOCX outline** in seconds.
     
-    ✅ Ideal for **lecture notes**, **research papers**, project reports, or study material  
-    🗑️ **Uploaded PDFs and DOCX outputs are automatically deleted** after your session ends  
-    📎 DOCX is **stylized, formatted**, and ready to edit in Word or Google Docs  
-    🌈 Keywords are **color-highlighted** to boost clarity and readability  
-    📄 Works best with text-based PDFs (not scanned image PDFs)
+        ✅ Ideal for **lecture notes**, **research papers**, project reports, or study material  
+        🗑️ **DOCX outputs are kept only for a limited time** (so re-uploads are instant), then deleted automatically  
+        📎 DOCX is **stylized, formatted**, and ready to edit in Word or Google Docs  
+        🌈 Keywords are **color-highlighted** to boost clarity and readability  
+        📄 Works best with text-based PDFs (not scanned image PDFs)
     
-    ---
-    ✨ *Use PrettyNotes to convert chaos into clarity – perfect for students, educators, and lifelong learners!*
-    """, elem_id="top-markdown")
-
-    # FOR FUTURE UPDATES
-    # model_selector = gr.Radio(choices=["Gemini", "DeepSeek", "LLaMA", "Mistral"], label="Select Model")
-
-    # # Font settings
-    # heading_font_dropdown = gr.Dropdown(choices=["Courier New", "Arial", "Times New Roman", "Calibri"], label="Heading Font", value="Courier New")
-    # heading_font_size = gr.Slider(10, 24, value=14, step=1, label="Heading Font Size")
-    # body_font_size = gr.Slider(8, 16, value=12, step=1, label="Body Font Size")
-
-    with gr.Row(elem_classes="app-row"):
-        with gr.Column(scale=3, elem_classes="app-column"):
-            pdf_input = gr.File(label="📄 Upload Your PDF", type="filepath")
-            convert_button = gr.Button("🚀 Convert to Outline")
-        with gr.Column(scale=2, elem_classes="app-column"):
-            status_output = gr.Textbox(label="📣 Status", interactive=False)
-            docx_output = gr.File(label="📥 Download DOCX")
-
-    convert_button.click(
-        convert_pdf_to_outline_simplified,
-        inputs=[pdf_input],
-        outputs=[status_output, docx_output]
+        ---
+        ✨ *Use PrettyNotes to convert chaos into clarity – perfect for students, educators, and lifelong learners!*
+        """, elem_id="top-markdown")
+
+        # FOR FUTURE UPDATES
+        # model_selector = gr.Radio(choices=["Gemini", "DeepSeek", "LLaMA", "Mistral"], label="Select Model")
+
+        # # Font settings
+        # heading_font_dropdown = gr.Dropdown(choices=["Courier New", "Arial", "Times New Roman", "Calibri"], label="Heading Font", value="Courier New")
+        # heading_font_size = gr.Slider(10, 24, value=14, step=1, label="Heading Font Size")
+        # body_font_size = gr.Slider(8, 16, value=12, step=1, label="Body Font Size")
+
+        with gr.Row(elem_classes="app-row"):
+            with gr.Column(scale=3, elem_classes="app-column"):
+                pdf_input = gr.File(label="📄 Upload Your PDF", type="filepath")
+                convert_button = gr.Button("🚀 Convert to Outline")
+            with gr.Column(scale=2, elem_classes="app-column"):
+                status_output = gr.Textbox(label="📣 Status", interactive=False)
+                docx_output = gr.File(label="📥 Download DOCX")
+        with gr.Row(elem_classes="app-row"):
+            outline_preview = gr.Textbox(label="🧾 Outline Preview", lines=15, max_lines=30, interactive=False)
+
+        # While a request waits, Gradio overlays its queue position and ETA on these outputs
+        convert_button.click(
+            convert,
+            inputs=[pdf_input],
+            outputs=[status_output, outline_preview, docx_output],
+            show_progress="full"
+        )
+
+    demo.queue(
+        default_concurrency_limit=QUEUE_SETTINGS.concurrency,
+        max_size=QUEUE_SETTINGS.max_queue
     )
-
-demo.launch()
\ No newline at end of file
+    return demo
+
+def serve_with_metrics(demo):
+    """Serve the Gradio app with Prometheus metrics (see telemetry.py) at /metrics on the same port."""
+    import gradio as gr
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    server = FastAPI()
+
+    @server.get("/metrics")
+    def metrics():
+        return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+    server = gr.mount_gradio_app(server, demo, path="/")
+    # The same settings demo.launch() reads
+    host = os.getenv("GRADIO_SERVER_NAME", "127.0.0.1")
+    port = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+    print(f"Running on http://{host}:{port} (metrics at http://{host}:{port}/metrics)")
+    uvicorn.run(server, host=host, port=port)
+
+def main(argv=None):
+    global QUEUE_SETTINGS
+    QUEUE_SETTINGS = parse_queue_settings(argv)
+    configure_pool(max_concurrent_calls=QUEUE_SETTINGS.max_gemini_calls)
+    get_output_store().prune()
+    if METRICS_ENABLED:
+        serve_with_metrics(create_app())
+    else:
+        create_app().launch()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
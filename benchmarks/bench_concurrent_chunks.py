@@ -0,0 +1,49 @@
+# Wall-clock time for formatting a document's chunks sequentially vs. concurrently,
+# measured against the local fake Gemini server (no network, no API quota).
+#
+# Usage:
+#   python benchmarks/bench_concurrent_chunks.py --chunks 24 --latency 0.5
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import start_server
+from new_v4 import GeminiContentPreservingConverter
+
+SAMPLE_PARAGRAPH = (
+    "Strategic planning involves multiple steps. First, assess the current situation. "
+    "Market analysis is crucial. External factors must be considered before any decision."
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    chunks = [f"Section {i}\n\n{SAMPLE_PARAGRAPH}" for i in range(args.chunks)]
+
+    print(f"{args.chunks} chunks, {args.latency:.2f}s simulated latency per call")
+    baseline = None
+    for concurrency in args.concurrency:
+        converter = GeminiContentPreservingConverter(api_key="fake", api_endpoint=endpoint, max_concurrent_chunks=concurrency,
+                                                     use_cache=False) # Every level must really call the (fake) API
+        start = time.perf_counter()
+        outlines = converter.format_chunks(chunks, "\n\n".join(chunks))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        in_order = all(f"Section {i}" in outline for i, outline in enumerate(outlines))
+        print(f"concurrency={concurrency:<3} {elapsed:7.2f}s  speedup x{baseline / elapsed:4.1f}  ordered={in_order}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
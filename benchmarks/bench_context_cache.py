@@ -0,0 +1,86 @@
+# Input tokens and latency per chunk with and without Gemini context caching of the formatting
+# instructions, against the local fake Gemini server (which counts the input tokens each call
+# sends and charges --token-latency seconds per fresh token for prompt processing). The server
+# refuses caches below PRETTYNOTES_CONTEXT_CACHE_MIN_TOKENS as Gemini does, and the benchmark
+# refuses to run for a model or prefix Gemini wouldn't cache, rather than report savings no real
+# call could get.
+#
+# Usage:
+#   python benchmarks/bench_context_cache.py --model gemini-1.5-flash-002 --chunks 24 --latency 0.3 --token-latency 0.0002
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import start_server
+from new_v4 import DEFAULT_MODEL_NAME, FORMATTING_INSTRUCTIONS, GeminiContentPreservingConverter, estimate_tokens
+from prompt_cache import CONTEXT_CACHE_MIN_TOKENS, GeminiPromptCache, context_cache_unusable
+
+SAMPLE_PARAGRAPH = (
+    "Strategic planning involves multiple steps. First, assess the current situation. "
+    "Market analysis is crucial. External factors must be considered before any decision."
+)
+
+
+def run(converter, chunks, server):
+    counters = server.RequestHandlerClass
+    calls_before, tokens_before, cached_before = counters.generate_requests, counters.input_tokens, counters.cached_tokens
+    seconds = []
+    outlines = []
+    for chunk in chunks:
+        start = time.perf_counter()
+        outlines.extend(converter.format_chunks([chunk], chunk))
+        seconds.append(time.perf_counter() - start)
+    calls = counters.generate_requests - calls_before
+    return {
+        'calls': calls,
+        'input_tokens': (counters.input_tokens - tokens_before) / calls,
+        'cached_tokens': (counters.cached_tokens - cached_before) / calls,
+        'p50': statistics.median(seconds),
+        'total': sum(seconds),
+        'outlined': all(outline.startswith("1. Section") for outline in outlines),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--chunks", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fixed seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.0002, help="Extra seconds per fresh input token")
+    args = parser.parse_args()
+
+    reason = context_cache_unusable(args.model, estimate_tokens(FORMATTING_INSTRUCTIONS))
+    if reason:
+        print(f"Gemini would not cache the formatting instructions: {reason}. Nothing to compare.")
+        return 2
+
+    server = start_server(latency=args.latency, token_latency=args.token_latency, min_cached_tokens=CONTEXT_CACHE_MIN_TOKENS)
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+    chunks = [f"Section {i}\n\n{SAMPLE_PARAGRAPH}" for i in range(args.chunks)]
+    prefix_tokens = len(FORMATTING_INSTRUCTIONS) // 4 # As the fake server counts them
+
+    results = {}
+    for cached in (False, True):
+        converter = GeminiContentPreservingConverter(api_key="fake", model_name=args.model, api_endpoint=endpoint, max_concurrent_chunks=1, use_cache=False)
+        converter.prompt_cache = GeminiPromptCache(args.model, FORMATTING_INSTRUCTIONS) if cached else None
+        results[cached] = run(converter, chunks, server)
+        r = results[cached]
+        label = "context cache" if cached else "full prompt"
+        print(f"{label:<14} {r['calls']} calls: {r['input_tokens']:7.0f} input tokens sent per call ({r['cached_tokens']:.0f} from cache), "
+              f"p50 {r['p50']:.3f}s, total {r['total']:.2f}s, all outlined={r['outlined']}")
+
+    saved = results[False]['input_tokens'] - results[True]['input_tokens']
+    # The cached call sends everything except the instructions (and the blank line after them stays in the chunk part)
+    ok = abs(saved - prefix_tokens) <= 1 and results[True]['cached_tokens'] >= prefix_tokens - 1
+    print(f"Saved {saved:.0f} input tokens per call (instructions: {prefix_tokens}) -> {'OK' if ok else 'MISMATCH'}; "
+          f"p50 latency {results[False]['p50']:.3f}s -> {results[True]['p50']:.3f}s")
+    server.shutdown()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Time-to-first-token: first (cold) request vs. later requests served from the converter pool.
+#
+# Usage:
+#   GEMINI_API_KEY=... python benchmarks/bench_converter_pool.py --requests 5
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from converter_pool import ConverterPool
+from new_v4 import GeminiContentPreservingConverter
+
+PROMPT = "Format as an outline:\n---\nStrategic planning involves multiple steps. First, assess current situation.\n---"
+
+
+def time_to_first_token(get_converter):
+    """Seconds from 'button click' until the first streamed token arrives."""
+    start = time.perf_counter()
+    converter = get_converter()
+    response = converter.model.generate_content(PROMPT, stream=True)
+    for _ in response:
+        break
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        print("GEMINI_API_KEY is not set.")
+        return
+
+    pool = ConverterPool()
+    pooled = [time_to_first_token(lambda: pool.get(api_key)) for _ in range(args.requests)]
+    fresh = [time_to_first_token(lambda: GeminiContentPreservingConverter(api_key=api_key))
+             for _ in range(args.requests)]
+
+    print("\n--- Time to first token ---")
+    print(f"pooled, first request : {pooled[0] * 1000:8.1f} ms")
+    if len(pooled) > 1:
+        print(f"pooled, later (median): {statistics.median(pooled[1:]) * 1000:8.1f} ms")
+    print(f"new converter (median): {statistics.median(fresh) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
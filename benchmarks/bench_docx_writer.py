@@ -0,0 +1,145 @@
+# Peak memory and time for writing a large outline to DOCX: the streaming writer (docx_stream.py)
+# against building the whole document with python-docx and saving it at the end.
+# Each run happens in a fresh process so peak RSS readings don't leak between them.
+#
+# Usage:
+#   python benchmarks/bench_docx_writer.py --sections 250 1000 4000   (the python-docx run needs `pip install python-docx`)
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BULLETS_PER_SECTION = 20 # Roughly a page and a half of outline per section
+SAMPLE_BULLET = "If the development process is key, the first step is to assess the current situation and market analysis."
+
+
+def synthetic_outline(sections):
+    lines = []
+    for s in range(1, sections + 1):
+        lines.append(f"{s}. Section {s} main topic")
+        for b in range(BULLETS_PER_SECTION):
+            if b == BULLETS_PER_SECTION // 2:
+                lines.append(f"  {s}.a. Subsection of {s}")
+            indent = "  " if b >= BULLETS_PER_SECTION // 2 else ""
+            lines.append(f"{indent}{'| ' if b % 5 == 4 else ''}|-- {SAMPLE_BULLET} ({s}.{b})")
+    return "\n".join(lines)
+
+
+class PythonDocxWriter:
+    """Same interface as StreamingDocxWriter, but builds a python-docx Document and saves it on close."""
+    def __init__(self, path, font_name, font_size):
+        from docx import Document
+        from docx.shared import Pt
+        self.path = path
+        self.paragraph_count = 0
+        self.document = Document()
+        self.document.styles['Normal'].font.name = font_name
+        self.document.styles['Normal'].font.size = Pt(font_size)
+
+    def add_paragraph(self, runs, left_indent=None, space_before=None, space_after=None, line_spacing=None, align='left'):
+        from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+        from docx.shared import Inches, Pt, RGBColor
+        paragraph = self.document.add_paragraph()
+        if left_indent is not None:
+            paragraph.paragraph_format.left_indent = Inches(left_indent)
+        if space_before is not None:
+            paragraph.paragraph_format.space_before = Pt(space_before)
+        if space_after is not None:
+            paragraph.paragraph_format.space_after = Pt(space_after)
+        if line_spacing is not None:
+            paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
+            paragraph.paragraph_format.line_spacing = line_spacing
+        if align:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        for text, font_name, size, color, bold in (tuple(run) + (None,) * (5 - len(run)) for run in runs):
+            run = paragraph.add_run(text)
+            if font_name:
+                run.font.name = font_name
+            if size:
+                run.font.size = Pt(size)
+            if color:
+                run.font.color.rgb = RGBColor.from_string(color)
+            if bold is not None:
+                run.bold = bold
+        self.paragraph_count += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.document.save(self.path)
+
+
+def rss_mb(field):
+    """VmRSS (current) or VmHWM (peak since the last reset_peak_rss) from /proc, in MB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """Start VmHWM from the current RSS, so building the synthetic outline doesn't count towards the peak."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        print("Could not reset peak RSS; the peak includes building the outline", file=sys.stderr)
+
+
+def child(writer, sections, path):
+    import new_v4
+    from new_v4 import GeminiContentPreservingConverter
+    if writer == "python-docx":
+        new_v4.StreamingDocxWriter = PythonDocxWriter
+    converter = GeminiContentPreservingConverter.__new__(GeminiContentPreservingConverter) # Rendering needs no model
+    converter.highlighter = new_v4.KeywordHighlighter(new_v4.KEYWORDS_TO_HIGHLIGHT)
+    converter._call_context = threading.local()
+    parsed = converter.parse_llm_outline(synthetic_outline(sections))
+    reset_peak_rss()
+    before = rss_mb("VmRSS")
+    start = time.perf_counter()
+    paragraphs = converter.create_docx_from_outline(parsed, path)
+    elapsed = time.perf_counter() - start
+    peak = rss_mb("VmHWM")
+    print(f"{paragraphs} {elapsed:.3f} {before:.1f} {peak:.1f} {os.path.getsize(path) / 2**20:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, nargs="+", default=[250, 1000, 4000])
+    parser.add_argument("--output", default="/tmp/prettynotes_bench.docx")
+    parser.add_argument("--child", nargs=2, metavar=("WRITER", "SECTIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], int(args.child[1]), args.output)
+        return
+
+    try:
+        import docx # noqa: F401
+        writers = ["streaming", "python-docx"]
+    except ImportError:
+        print("python-docx not installed; timing the streaming writer only")
+        writers = ["streaming"]
+
+    print(f"{BULLETS_PER_SECTION} bullets per section; RSS growth = peak RSS minus RSS before writing")
+    for sections in args.sections:
+        for writer in writers:
+            out = subprocess.run([sys.executable, __file__, "--child", writer, str(sections), "--output", args.output],
+                                 capture_output=True, text=True, check=True).stdout.split("\n")[-2]
+            paragraphs, elapsed, before, peak, size = out.split()
+            print(f"{sections:>6} sections {writer:<12} {int(paragraphs):>8} paragraphs {float(elapsed):7.2f}s  "
+                  f"peak RSS {float(peak):7.1f} MB (+{float(peak) - float(before):6.1f} MB while writing)  {float(size):6.2f} MB file")
+    if os.path.exists(args.output):
+        os.remove(args.output)
+
+
+if __name__ == "__main__":
+    main()
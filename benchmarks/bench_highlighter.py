@@ -0,0 +1,85 @@
+# Keyword highlighting cost per paragraph as the keyword dictionary grows: the single-pass
+# KeywordHighlighter against the previous approach of one regex search per keyword.
+# Also checks that both produce the same coloured segments.
+#
+# Usage:
+#   python benchmarks/bench_highlighter.py --keywords 100 1000 10000 --paragraphs 2000
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_highlighter import KeywordHighlighter
+from new_v4 import KEYWORDS_TO_HIGHLIGHT
+
+SAMPLE_PARAGRAPH = (
+    "If the development process is key, the first step is to assess the current situation. "
+    "Market analysis is crucial and external factors must be considered by the team before any decision."
+)
+
+
+def per_keyword_split(text, keywords):
+    """The highlighter KeywordHighlighter replaced: every keyword searched for separately."""
+    matches = []
+    for keyword in sorted(keywords, key=len, reverse=True):
+        for match in re.finditer(r'\b(' + re.escape(keyword) + r')\b', text, re.IGNORECASE):
+            matches.append((match.start(), match.end(), match.group(1), keywords[keyword]))
+    matches.sort(key=lambda m: m[0])
+    segments, last = [], 0
+    for start, end, word, color in matches:
+        if start > last:
+            segments.append((text[last:start], None))
+        segments.append((word, color))
+        last = end
+    if last < len(text):
+        segments.append((text[last:], None))
+    return segments
+
+
+def make_keywords(count, rng):
+    """The default keywords plus made-up words (some sharing prefixes) up to count."""
+    keywords = dict(KEYWORDS_TO_HIGHLIGHT)
+    colors = sorted(set(KEYWORDS_TO_HIGHLIGHT.values()))
+    while len(keywords) < count:
+        stem = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 8)))
+        keywords[stem + rng.choice(["", "ing", "tion", "s", "ed"])] = rng.choice(colors)
+    return keywords
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--old-paragraphs", type=int, default=50, help="Paragraphs timed with the per-keyword approach (it is slow at 10k keywords)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for count in args.keywords:
+        keywords = make_keywords(count, rng)
+        words = SAMPLE_PARAGRAPH.split() + rng.sample(sorted(keywords), 20)
+        paragraphs = [" ".join(rng.choice(words) for _ in range(40)) for _ in range(args.paragraphs)]
+
+        start = time.perf_counter()
+        highlighter = KeywordHighlighter(keywords)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_segments = [highlighter.split(p) for p in paragraphs]
+        new_per = (time.perf_counter() - start) / len(paragraphs)
+
+        sample = paragraphs[:args.old_paragraphs]
+        start = time.perf_counter()
+        old_segments = [per_keyword_split(p, keywords) for p in sample]
+        old_per = (time.perf_counter() - start) / len(sample)
+
+        same = old_segments == new_segments[:len(sample)]
+        print(f"{len(keywords):>6} keywords  build {build * 1000:7.1f}ms  single pass {new_per * 1e6:8.1f}us/paragraph  "
+              f"per keyword {old_per * 1e6:10.1f}us/paragraph  x{old_per / new_per:6.1f}  same output={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Gemini calls and wall-clock time for converting a slide deck, then re-converting it after
+# editing a single slide. Unchanged slides are re-chunked as before and served from the cache.
+#
+# Usage:
+#   python benchmarks/bench_incremental.py --pages 100 --latency 0.5
+#   python benchmarks/bench_incremental.py --pages 100 --chunk-tokens 400   # best case: about one slide per chunk
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SLIDE_BODY = "Market analysis is crucial. External factors must be considered before any decision is made."
+
+
+def make_deck(path, pages, edited_page=None):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=960, height=540)
+        page.insert_text((40, 60), f"Slide {page_num + 1}: Strategic planning", fontsize=28)
+        body = SLIDE_BODY + (" This slide was corrected." if page_num == edited_page else "")
+        page.insert_textbox(fitz.Rect(40, 100, 920, 500), f"{body}\n" * 3, fontsize=16)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--chunk-tokens", type=int, default=int(os.getenv("PRETTYNOTES_CHUNK_TOKENS", "5000")),
+                        help="Token budget per chunk (default: the production one). Smaller budgets reuse more of an edited document")
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    # Read at import time, so set before importing the converter
+    os.environ["PRETTYNOTES_CACHE_DIR"] = os.path.join(tmp.name, "cache")
+    os.environ["PRETTYNOTES_CHUNK_TOKENS"] = str(args.chunk_tokens)
+    from fake_gemini_server import start_server
+    from new_v4 import GeminiContentPreservingConverter
+
+    print(f"{args.pages} slides, chunks of up to {args.chunk_tokens} tokens")
+    server = start_server(latency=args.latency)
+    converter = GeminiContentPreservingConverter(api_key="fake", api_endpoint=f"http://127.0.0.1:{server.server_port}")
+
+    runs = [("original", None), ("one slide edited", args.pages // 2)]
+    for label, edited_page in runs:
+        pdf_path = os.path.join(tmp.name, f"deck_{label.replace(' ', '_')}.pdf")
+        make_deck(pdf_path, args.pages, edited_page)
+        calls_before = server.RequestHandlerClass.generate_requests
+        start = time.perf_counter()
+        result = converter.process_file(pdf_path, os.path.join(tmp.name, "out.docx"))
+        elapsed = time.perf_counter() - start
+        calls = server.RequestHandlerClass.generate_requests - calls_before
+        print(f"{label:18} {result.total_chunks:4} chunks  {calls:4} Gemini calls  {elapsed:7.2f}s")
+
+    server.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Throughput of the on-CPU llama.cpp backend: prompt evaluation and generation tokens/sec,
+# and pages/min for synthetic lecture-notes pages sent through the converter's normal prompt.
+# Nothing leaves the machine.
+#
+# Usage (needs `pip install llama-cpp-python` and a small instruct GGUF, e.g. Qwen2.5-1.5B-Instruct Q4_K_M):
+#   python benchmarks/bench_local_backend.py --model models/qwen2.5-1.5b-instruct-q4_k_m.gguf --pages 6
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_backends import LLAMA_BATCH_TOKENS, LLAMA_THREADS, BackendError, BackendRouter, LlamaCppBackend
+from new_v4 import GeminiContentPreservingConverter
+from preservation import check_preservation
+
+SENTENCES = [
+    "Strategic planning involves multiple steps and a clear view of the current situation.",
+    "Market analysis is crucial before any decision about new products is made.",
+    "External factors such as regulation and competition must be considered.",
+    "The team should assess which resources and skills are available.",
+    "Each stage of the process is evaluated against the goals set in the first step.",
+    "Data from earlier projects helps to estimate costs and timelines.",
+]
+
+
+def synthetic_page(rng, words_per_page):
+    lines, words = [f"Topic {rng.randint(1, 99)}"], 0
+    while words < words_per_page:
+        sentence = rng.choice(SENTENCES)
+        lines.append(sentence)
+        words += len(sentence.split())
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.getenv("PRETTYNOTES_LLAMA_MODEL"), help="GGUF model file (default: PRETTYNOTES_LLAMA_MODEL)")
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--pages-per-chunk", type=int, default=2)
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=LLAMA_THREADS)
+    parser.add_argument("--batch", type=int, default=LLAMA_BATCH_TOKENS, help="Prompt tokens evaluated per forward pass")
+    args = parser.parse_args()
+    if not args.model:
+        parser.error("--model (or PRETTYNOTES_LLAMA_MODEL) is required")
+
+    backend = LlamaCppBackend("llama", args.model, n_batch=args.batch, n_threads=args.threads)
+    start = time.perf_counter()
+    try:
+        backend.load()
+    except BackendError as e:
+        sys.exit(str(e))
+    print(f"Model loaded in {time.perf_counter() - start:.1f}s ({args.threads} threads, batch {args.batch})")
+
+    converter = GeminiContentPreservingConverter.__new__(GeminiContentPreservingConverter) # Only the prompt and routing are used
+    converter.router = BackendRouter([backend])
+    rng = random.Random(0)
+    pages = [synthetic_page(rng, args.words_per_page) for _ in range(args.pages)]
+    chunks = ["\n\n".join(pages[i:i + args.pages_per_chunk]) for i in range(0, len(pages), args.pages_per_chunk)]
+
+    coverages = []
+    start = time.perf_counter()
+    for n, chunk in enumerate(chunks, 1):
+        outline = converter.process_with_gemini(chunk, n, len(chunks), None)
+        coverages.append(check_preservation(chunk, outline).coverage if outline else 0.0)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(pages)} pages in {len(chunks)} chunks: {elapsed:.1f}s, {len(pages) / elapsed * 60:.1f} pages/min")
+    print(f"prompt eval  {backend.prompt_tokens:>7} tokens  {backend.prompt_tokens / max(backend.prompt_seconds, 1e-9):7.1f} tokens/s")
+    print(f"generation   {backend.completion_tokens:>7} tokens  {backend.completion_tokens / max(backend.generation_seconds, 1e-9):7.1f} tokens/s")
+    print(f"mean preservation {sum(coverages) / len(coverages):.1%}")
+
+
+if __name__ == "__main__":
+    main()
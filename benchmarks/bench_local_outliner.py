@@ -0,0 +1,74 @@
+# Latency, Gemini calls and preservation score of the local outline engine vs. Gemini,
+# on a generated PDF with font-size headings and bookmarks. Gemini is the local fake server
+# unless --real is given (then GEMINI_API_KEY is used and real quota is spent).
+#
+# Usage:
+#   python benchmarks/bench_local_outliner.py --pages 60 --latency 2.0
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import start_server
+from new_v4 import GeminiContentPreservingConverter
+
+PARAGRAPH = (
+    "Strategic planning involves multiple steps. First, assess the current situation. "
+    "Market analysis is crucial, and external factors must be considered before any decision is made."
+)
+
+
+def make_pdf(path, pages):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    toc = []
+    for page_num in range(pages):
+        page = doc.new_page()
+        chapter = f"Chapter {page_num // 5 + 1}"
+        if page_num % 5 == 0:
+            page.insert_text((50, 70), chapter, fontsize=22)
+            toc.append([1, chapter, page_num + 1])
+        page.insert_text((50, 110), f"Section {page_num + 1}", fontsize=15)
+        page.insert_textbox(fitz.Rect(50, 130, 550, 780), "\n\n".join([PARAGRAPH] * 4), fontsize=11)
+    doc.set_toc(toc)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=2.0, help="Seconds per fake Gemini call")
+    parser.add_argument("--real", action="store_true", help="Call the real Gemini API instead of the fake server")
+    args = parser.parse_args()
+
+    server = None
+    api_key, endpoint = os.getenv("GEMINI_API_KEY", ""), None
+    if not args.real:
+        server = start_server(latency=args.latency)
+        api_key, endpoint = "fake", f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "structured.pdf")
+        make_pdf(pdf_path, args.pages)
+        print(f"{args.pages} pages; {'real Gemini' if args.real else f'fake Gemini, {args.latency:.1f}s per call'}")
+        for engine in ("gemini", "auto", "local"):
+            converter = GeminiContentPreservingConverter(api_key=api_key, api_endpoint=endpoint, use_cache=False, engine=engine)
+            events = []
+            start = time.perf_counter()
+            result = converter.process_file(pdf_path, os.path.join(tmp, f"{engine}.docx"), progress_callback=events.append)
+            elapsed = time.perf_counter() - start
+            gemini_chunks = sum(1 for e in events if e['type'] == 'chunk_done' and e['engine'] == 'gemini')
+            score = f"{result.preservation_score:.1%}" if result.preservation_score is not None else "n/a"
+            print(f"engine={engine:7} {elapsed:7.2f}s  {gemini_chunks:3}/{result.total_chunks} chunks via Gemini  preservation {score}")
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# PDF text extraction time vs. number of extraction worker processes, on a generated
+# many-page PDF. Every run must return exactly the same text as the single-process run.
+#
+# Usage:
+#   python benchmarks/bench_parallel_extraction.py --pages 500 --workers 1 2 4 8
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import new_v4
+from new_v4 import GeminiContentPreservingConverter
+
+SAMPLE_LINE = "Strategic planning involves multiple steps; market analysis is crucial before any decision."
+
+
+def make_pdf(path, pages, lines_per_page):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = "\n".join(f"Page {page_num} line {i}: {SAMPLE_LINE}" for i in range(lines_per_page))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--lines-per-page", type=int, default=80)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # Benchmark the sharding itself, not the small-PDF shortcut
+    new_v4.MIN_PAGES_PER_EXTRACTION_WORKER = 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "bench.pdf")
+        make_pdf(pdf_path, args.pages, args.lines_per_page)
+        print(f"{args.pages} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB, best of {args.runs} runs")
+
+        baseline_time = baseline_text = None
+        for workers in args.workers:
+            # Extraction never touches Gemini, so skip __init__ (and the API key it needs)
+            converter = GeminiContentPreservingConverter.__new__(GeminiContentPreservingConverter)
+            converter.extraction_workers = workers
+            best = float("inf")
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                text = converter.extract_text_from_pdf(pdf_path)
+                best = min(best, time.perf_counter() - start)
+            baseline_time = baseline_time or best
+            baseline_text = baseline_text or text
+            print(f"workers={workers:<3} {best:7.2f}s  speedup x{baseline_time / best:4.1f}  identical={text == baseline_text}")
+
+
+if __name__ == "__main__":
+    main()
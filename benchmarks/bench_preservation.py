@@ -0,0 +1,72 @@
+# Content preservation check on growing documents: the rolling-hash checker in preservation.py
+# against the previous sentence-by-sentence comparison. tests/test_preservation.py checks its results.
+#
+# Usage:
+#   python benchmarks/bench_preservation.py --words 10000 100000 1000000
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preservation import check_preservation
+
+VOCABULARY = [f"w{i}" for i in range(5000)]
+
+
+def make_text(words, rng):
+    """Sentences of 8-20 words, roughly two per line."""
+    out, n = [], 0
+    while n < words:
+        length = min(rng.randint(8, 20), words - n)
+        out.append(" ".join(rng.choice(VOCABULARY) for _ in range(length)).capitalize() + ("." if rng.random() < 0.5 else ".\n"))
+        n += length
+    return " ".join(out)
+
+
+def as_outline(text):
+    """Number every line like an outline would."""
+    return "\n".join(f"{i}. {line}" for i, line in enumerate(text.split("\n"), 1))
+
+
+def sentence_ratio(outline_text, original_text):
+    """The checker preservation.py replaced: each original sentence against each outline sentence."""
+    original_sentences = [s.strip() for s in re.split(r'[.!?]+', original_text) if len(s.strip()) > 10]
+    outline_word_sets = [set(re.findall(r'\b\w+\b', s.lower())) for s in re.split(r'[.!?]+', outline_text) if len(s.strip()) > 10]
+    preserved = 0
+    for sentence in original_sentences:
+        words = set(re.findall(r'\b\w+\b', sentence.lower()))
+        if any(len(words & other) / len(words) >= 0.9 for other in outline_word_sets):
+            preserved += 1
+    return preserved / len(original_sentences) if original_sentences else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--old-max-words", type=int, default=20000, help="Skip the old checker above this size (it is quadratic)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for words in args.words:
+        original = make_text(words, rng)
+        # A lightly edited outline: numbered lines, one sentence in fifty dropped
+        outline = as_outline(". ".join(s for s in original.split(". ") if rng.random() > 0.02))
+
+        start = time.perf_counter()
+        report = check_preservation(original, outline)
+        elapsed = time.perf_counter() - start
+        line = f"{words:>9} words  rolling hash {elapsed:7.3f}s ({words / elapsed / 1e6:4.2f}M words/s) coverage {report.coverage:.2%}"
+
+        if words <= args.old_max_words:
+            start = time.perf_counter()
+            ratio = sentence_ratio(outline, original)
+            line += f"  |  sentence pairs {time.perf_counter() - start:7.3f}s ratio {ratio:.2%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
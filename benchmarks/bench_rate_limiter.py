@@ -0,0 +1,94 @@
+# Shared Gemini rate limiting: how long a second user waits behind a large upload (round-robin
+# vs. first come first served), and whether several processes sharing the SQLite buckets stay
+# within one requests-per-minute budget together.
+#
+# Usage:
+#   python benchmarks/bench_rate_limiter.py --rpm 600 --processes 4
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import RateLimiter
+
+
+def drain(limiter, rpm):
+    """Use up the initial burst (a full minute's budget) so the run measures the steady refill rate."""
+    for _ in range(rpm):
+        limiter.acquire(1)
+
+
+def fairness(rpm, big_requests, small_requests, round_robin):
+    """Seconds user 'small' waits on average when it arrives just after user 'big' queued big_requests calls."""
+    limiter = RateLimiter(requests_per_minute=rpm, tokens_per_minute=0)
+    drain(limiter, rpm)
+    waits = {'big': [], 'small': []}
+    lock = threading.Lock()
+
+    def call(user):
+        waited = limiter.acquire(1, user=user if round_robin else None)
+        with lock:
+            waits[user].append(waited)
+
+    with ThreadPoolExecutor(max_workers=big_requests + small_requests) as executor:
+        for _ in range(big_requests):
+            executor.submit(call, 'big')
+        time.sleep(0.05)
+        for _ in range(small_requests):
+            executor.submit(call, 'small')
+    return sum(waits['small']) / len(waits['small']), max(waits['big'])
+
+
+def worker_calls(path, rpm, calls):
+    limiter = RateLimiter(requests_per_minute=rpm, tokens_per_minute=0, shared_path=path, scope="bench")
+    for _ in range(calls):
+        limiter.acquire(1)
+    return calls
+
+
+def shared_rate(rpm, processes, calls_per_process, shared):
+    """Requests per minute achieved by `processes` processes together, each limited to rpm."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rate_limits.sqlite3") if shared else None
+        if shared:
+            drain(RateLimiter(requests_per_minute=rpm, tokens_per_minute=0, shared_path=path, scope="bench"), rpm)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            # Unshared processes each start with their own full burst; drain it inside the worker first
+            start = time.perf_counter()
+            calls = calls_per_process if shared else calls_per_process + rpm
+            total = sum(executor.map(worker_calls, [path] * processes, [rpm] * processes, [calls] * processes))
+            elapsed = time.perf_counter() - start
+        if not shared:
+            total -= rpm * processes
+        return total / elapsed * 60
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--big", type=int, default=40, help="Calls queued by the first user")
+    parser.add_argument("--small", type=int, default=4, help="Calls made by the second user just after")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=25, help="Calls per process in the shared-budget run")
+    args = parser.parse_args()
+
+    for round_robin in (False, True):
+        small_wait, big_last = fairness(args.rpm, args.big, args.small, round_robin)
+        label = "round-robin by user" if round_robin else "first come first served"
+        print(f"{label:<24} second user waits {small_wait:5.2f}s on average (first user's last call: {big_last:5.2f}s)")
+
+    for shared in (False, True):
+        rate = shared_rate(args.rpm, args.processes, args.calls, shared)
+        label = "shared SQLite buckets" if shared else "per-process buckets"
+        print(f"{label:<24} {args.processes} processes together made {rate:6.0f} requests/min (limit {args.rpm})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Where the multi-backend router sends chunks, and what failover costs, using local
+# OpenAI-compatible stub servers with different latencies (one of them failing every request).
+#
+# Usage:
+#   python benchmarks/bench_router.py --chunks 60 --latencies 0.2 0.6 --failing 1
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import start_server
+from model_backends import BackendRouter, OpenAICompatibleBackend
+
+PROMPT = "Format this chunk.\n---\nStrategic planning involves multiple steps.\nMarket analysis is crucial.\n---\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=60)
+    parser.add_argument("--latencies", type=float, nargs="+", default=[0.2, 0.6], help="One healthy stub backend per latency")
+    parser.add_argument("--failing", type=int, default=1, help="Stub backends that fail every request")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="Per-backend concurrency quota")
+    parser.add_argument("--workers", type=int, default=8, help="Chunks in flight at once")
+    args = parser.parse_args()
+
+    servers = []
+    backends = []
+    for i, latency in enumerate(args.latencies):
+        servers.append(start_server(latency=latency))
+        backends.append(OpenAICompatibleBackend(f"stub-{latency}s", f"http://127.0.0.1:{servers[-1].server_port}/v1", "stub",
+                                                max_concurrent=args.max_concurrent))
+    for i in range(args.failing):
+        servers.append(start_server(latency=0.05, fail_every=1))
+        backends.append(OpenAICompatibleBackend(f"failing-{i}", f"http://127.0.0.1:{servers[-1].server_port}/v1", "stub",
+                                                max_concurrent=args.max_concurrent))
+
+    router = BackendRouter(backends)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(lambda n: router.generate(PROMPT, n), range(1, args.chunks + 1)))
+    elapsed = time.perf_counter() - start
+
+    ok = all(text.startswith("1. Section") for text, _ in results)
+    print(f"{args.chunks} chunks over {len(backends)} backends in {elapsed:.2f}s ({args.workers} in flight), all outlined={ok}")
+    for name, m in router.metrics().items():
+        served = sum(1 for _, backend in results if backend == name)
+        p50 = f"{m['p50_seconds']:.2f}s" if m['p50_seconds'] is not None else "  -  "
+        print(f"  {name:<12} served {served:>4}  calls {m['calls']:>4}  failures {m['failures']:>3}  p50 {p50}  circuit {m['breaker']}")
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# Cold-import time of the entry points, each measured in a fresh interpreter.
+# The batch/worker paths should stay well under 200 ms because gradio, fitz,
+# google-generativeai and docx are only imported when they are actually used.
+#
+# Usage:
+#   python benchmarks/bench_startup.py --runs 10
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["new_v4", "converter_pool", "prettynotes", "app"]
+BUDGET_MS = 200
+
+
+def import_time_ms(module):
+    """Wall-clock time for `import module` in a new Python process, minus interpreter startup."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"Median cold import over {args.runs} runs (budget {BUDGET_MS} ms)")
+    for module in MODULES:
+        median = statistics.median(import_time_ms(module) for _ in range(args.runs))
+        verdict = "ok" if median < BUDGET_MS else "OVER BUDGET"
+        print(f"{module:15} {median:8.1f} ms  {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# Minimal stand-in for the Gemini REST API so chunk scheduling can be measured offline.
+#
+# It answers generateContent with a trivial outline of the chunk text after a fixed delay,
+# and can return 429s to exercise the converter's rate-limit backoff. countTokens answers
+# immediately with a length-based estimate. cachedContents (context caching) is supported too:
+# generateContent calls referencing a cache are answered as if the cached text preceded the
+# prompt, and the server counts how many input tokens were sent fresh vs. served from caches.
+# Like Gemini, it refuses to cache content below min_cached_tokens.
+#
+# Usage:
+#   python benchmarks/fake_gemini_server.py --port 8765 --latency 1.5
+#   GEMINI_API_ENDPOINT=http://127.0.0.1:8765 GEMINI_API_KEY=fake python app.py
+import argparse
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_outline(prompt):
+    """Turn the text between the '---' markers of a chunk prompt into a one-section outline."""
+    start = prompt.find("---")
+    end = prompt.rfind("---")
+    chunk_text = prompt[start + 3:end] if 0 <= start < end else prompt
+    lines = [line.strip() for line in chunk_text.splitlines() if line.strip()]
+    return "1. Section\n" + "\n".join(f"|-- {line}" for line in lines)
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    latency = 1.0
+    rate_limit_every = 0
+    token_latency = 0.0 # Extra seconds per fresh (uncached) input token, standing in for prompt processing time
+    generate_requests = 0 # Answered generateContent calls, for benchmarks counting API spend
+    input_tokens = 0 # Input tokens sent with those calls ...
+    cached_tokens = 0 # ... and those served from a context cache instead
+    min_cached_tokens = 0 # Smallest cacheable content; Gemini answers 400 below its minimum
+    cached_contents = {} # name -> cached text
+    _counter = itertools.count(1)
+    _counter_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _cached_content_json(self, name, ttl_seconds=3600):
+        expire_time = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        return {
+            "name": name,
+            "model": "models/fake",
+            "expireTime": expire_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "usageMetadata": {"totalTokenCount": len(self.cached_contents.get(name, "")) // 4},
+        }
+
+    def do_PATCH(self):
+        # CachedContent.update(ttl=...)
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        name = self.path.split("?")[0].split("/v1beta/")[-1]
+        if name not in self.cached_contents:
+            self._send_json(404, {"error": {"code": 404, "message": "Cached content not found", "status": "NOT_FOUND"}})
+            return
+        self._send_json(200, self._cached_content_json(name, float(str(request.get("ttl", "3600s")).rstrip("s"))))
+
+    def do_DELETE(self):
+        self.cached_contents.pop(self.path.split("?")[0].split("/v1beta/")[-1], None)
+        self._send_json(200, {})
+
+    def do_GET(self):
+        # genai.get_model(), used by the converter health check
+        model_name = self.path.split("?")[0].split("/v1beta/")[-1]
+        self._send_json(200, {"name": model_name, "supportedGenerationMethods": ["generateContent"]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = "".join(
+            part.get("text", "")
+            for content in request.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        if self.path.split("?")[0].endswith(":countTokens"):
+            self._send_json(200, {"totalTokens": len(prompt) // 4 + 1})
+            return
+        if self.path.split("?")[0].endswith("/cachedContents"):
+            # CachedContent.create(system_instruction=..., contents=...)
+            instructions = "".join(part.get("text", "") for part in request.get("systemInstruction", {}).get("parts", []))
+            tokens = len(instructions + prompt) // 4
+            if tokens < self.min_cached_tokens:
+                self._send_json(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                                                "message": f"Cached content is too small. total_token_count={tokens}, min_total_token_count={self.min_cached_tokens}"}})
+                return
+            with self._counter_lock:
+                name = f"cachedContents/fake-{next(self._counter)}"
+                self.cached_contents[name] = instructions + prompt
+            self._send_json(200, self._cached_content_json(name, float(str(request.get("ttl", "3600s")).rstrip("s"))))
+            return
+        cached_text = ""
+        if request.get("cachedContent"):
+            if request["cachedContent"] not in self.cached_contents:
+                self._send_json(404, {"error": {"code": 404, "message": "Cached content not found", "status": "NOT_FOUND"}})
+                return
+            cached_text = self.cached_contents[request["cachedContent"]]
+
+        with self._counter_lock:
+            request_number = next(self._counter)
+        if self.rate_limit_every and request_number % self.rate_limit_every == 0:
+            self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}})
+            return
+
+        fresh_tokens = len(prompt) // 4
+        cached_tokens = len(cached_text) // 4
+        time.sleep(self.latency + fresh_tokens * self.token_latency)
+        with self._counter_lock:
+            type(self).generate_requests += 1
+            type(self).input_tokens += fresh_tokens
+            type(self).cached_tokens += cached_tokens
+        self._send_json(200, {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": fake_outline(prompt)}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": fresh_tokens + cached_tokens, "cachedContentTokenCount": cached_tokens},
+        })
+
+
+def start_server(port=0, latency=1.0, rate_limit_every=0, token_latency=0.0, min_cached_tokens=0):
+    """Start the fake server on a background thread and return it (server.server_port has the port).
+
+    server.RequestHandlerClass holds the counters (generate_requests, input_tokens, cached_tokens).
+    """
+    handler = type("ConfiguredFakeGeminiHandler", (FakeGeminiHandler,), {
+        "latency": latency,
+        "rate_limit_every": rate_limit_every,
+        "token_latency": token_latency,
+        "min_cached_tokens": min_cached_tokens,
+        "cached_contents": {},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429 (0 = never)")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.rate_limit_every)
+    print(f"Fake Gemini listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
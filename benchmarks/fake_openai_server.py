@@ -0,0 +1,93 @@
+# Minimal stand-in for an OpenAI-compatible chat completions API (DeepSeek, Mistral, llama.cpp server, ...)
+# so the multi-backend router can be exercised offline.
+#
+# It answers POST /v1/chat/completions with the same trivial outline as fake_gemini_server.py after
+# a fixed delay, and can fail every Nth request (or every request) with a 500 to trip circuit breakers.
+#
+# Usage:
+#   python benchmarks/fake_openai_server.py --port 8766 --latency 0.8
+#   echo '[{"name": "stub", "base_url": "http://127.0.0.1:8766/v1", "model": "stub"}]' > backends.json
+#   PRETTYNOTES_BACKENDS_FILE=backends.json python app.py
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_gemini_server import fake_outline
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 1.0
+    fail_every = 0 # 1 = every request fails
+    completions = 0 # Answered requests, for benchmarks counting where chunks went
+    _counter = itertools.count(1)
+    _counter_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+
+        with self._counter_lock:
+            request_number = next(self._counter)
+        time.sleep(self.latency)
+        if self.fail_every and request_number % self.fail_every == 0:
+            self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        with self._counter_lock:
+            type(self).completions += 1
+        self._send_json(200, {
+            "id": f"chatcmpl-{request_number}",
+            "object": "chat.completion",
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": fake_outline(prompt)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 0, "total_tokens": len(prompt) // 4},
+        })
+
+
+def start_server(port=0, latency=1.0, fail_every=0):
+    """Start the fake server on a background thread and return it (server.server_port has the port)."""
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), {
+        "latency": latency,
+        "fail_every": fail_every,
+        "_counter": itertools.count(1),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with a 500 (0 = never, 1 = always)")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.fail_every)
+    print(f"Fake OpenAI-compatible API listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Process-wide pool of GeminiContentPreservingConverter instances.
+# Building a converter configures the Gemini client and model handle, so we do it
+# once per model and share the result across Gradio worker threads.
+import threading
+import time
+
+from new_v4 import GeminiContentPreservingConverter, DEFAULT_MODEL_NAME
+
+# Re-check a pooled converter at most this often (seconds)
+HEALTH_CHECK_INTERVAL = 300
+HEALTH_RECHECK_INTERVAL = 30 # ... or this often after a failed check
+HEALTH_CHECK_FAILURES = 3 # Consecutive failed checks before a converter is rebuilt
+
+
+class _Entry:
+    def __init__(self, converter, api_key, now):
+        self.converter = converter
+        self.api_key = api_key
+        self.next_check = now
+        self.failures = 0
+        self.checking = False
+
+
+class ConverterPool:
+    def __init__(self, health_check_interval=HEALTH_CHECK_INTERVAL, **converter_options):
+        """Converters are built lazily on first use, never at import time.
+
+        converter_options (e.g. max_concurrent_calls) are passed to every converter the pool builds.
+        """
+        self.health_check_interval = health_check_interval
+        self.converter_options = converter_options
+        self._lock = threading.Lock()
+        self._converters = {} # model name -> _Entry
+
+    def get(self, api_key, model_name=DEFAULT_MODEL_NAME):
+        """Return the shared converter for this model, building it if needed.
+
+        Pooled by model only: genai.configure() is process-wide, so converters for different keys
+        could not be kept apart anyway. A different key (e.g. after rotation) rebuilds the converter.
+        """
+        due = False
+        with self._lock:
+            entry = self._converters.get(model_name)
+            now = time.monotonic()
+            if entry is None or entry.api_key != api_key:
+                # Exceptions propagate to the caller so the UI can report them
+                entry = self._build(api_key, model_name, now)
+            elif not entry.checking and now >= entry.next_check:
+                entry.checking = True # Only this caller checks; the rest keep using the converter meanwhile
+                due = True
+        if due:
+            self._check(model_name, entry)
+        return entry.converter
+
+    def _build(self, api_key, model_name, now):
+        converter = GeminiContentPreservingConverter(api_key=api_key, model_name=model_name, **self.converter_options)
+        entry = _Entry(converter, api_key, now + self.health_check_interval)
+        self._converters[model_name] = entry
+        return entry
+
+    def _check(self, model_name, entry):
+        """Health check outside the lock (it is a network call); rebuild only after repeated failures."""
+        try:
+            healthy = entry.converter.health_check()
+        except Exception as e:
+            print(f"Health check for model {model_name} raised {e}.")
+            healthy = False
+        with self._lock:
+            entry.checking = False
+            now = time.monotonic()
+            if healthy:
+                entry.failures = 0
+                entry.next_check = now + self.health_check_interval
+                return
+            entry.failures += 1
+            entry.next_check = now + HEALTH_RECHECK_INTERVAL
+            if entry.failures < HEALTH_CHECK_FAILURES or self._converters.get(model_name) is not entry:
+                return
+            print(f"Converter for model {model_name} failed {entry.failures} health checks in a row; rebuilding it.")
+            try:
+                self._build(entry.api_key, model_name, now)
+            except Exception as e:
+                print(f"Rebuilding the converter failed ({e}); keeping the current one.")
+
+    def clear(self):
+        """Drop every pooled converter (e.g. after the API key is rotated)."""
+        with self._lock:
+            self._converters.clear()
+
+
+_POOL = ConverterPool()
+
+
+def configure_pool(**converter_options):
+    """Set options for converters the process-wide pool builds from now on (call at startup)."""
+    _POOL.converter_options.update(converter_options)
+    _POOL.clear()
+
+
+def get_converter(api_key, model_name=DEFAULT_MODEL_NAME):
+    """Shortcut for the process-wide pool."""
+    return _POOL.get(api_key, model_name)
@@ -0,0 +1,179 @@
+# DOCX writer that streams paragraphs straight into the zip instead of building a python-docx
+# document tree in memory. Memory stays flat however long the outline is, and there is no
+# long serialization stall at the end: the file is finished as soon as the last paragraph is added.
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+FLUSH_BYTES = 64 * 1024 # Paragraph XML buffered before it is compressed into the zip
+DEFAULT_FONT_NAME = 'Courier New'
+DEFAULT_FONT_SIZE = 12
+LINE_SPACING_UNIT = 240 # w:line value for single spacing
+TWIPS_PER_INCH = 1440
+TWIPS_PER_POINT = 20
+
+_W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+# Characters XML 1.0 can't hold; python-docx raises on them, here they are dropped
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_LINE_BREAKS = re.compile(r'(\r\n|\r|\n|\t)')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Letter paper with Word's default margins, as in python-docx's default template
+_SECTION = (
+    '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+    '<w:pgMar w:top="1440" w:right="1800" w:bottom="1440" w:left="1800" w:header="720" w:footer="720" w:gutter="0"/>'
+    '</w:sectPr>'
+)
+
+
+def _font_xml(font_name):
+    name = escape(font_name, {'"': '&quot;'})
+    return f'<w:rFonts w:ascii="{name}" w:hAnsi="{name}" w:eastAsia="{name}" w:cs="{name}"/>'
+
+
+def _styles_xml(font_name, font_size):
+    """Normal style in the given font, like setting document.styles['Normal'].font in python-docx."""
+    half_points = round(font_size * 2)
+    run_properties = f'<w:rPr>{_font_xml(font_name)}<w:sz w:val="{half_points}"/><w:szCs w:val="{half_points}"/></w:rPr>'
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<w:styles xmlns:w="{_W}">'
+        f'<w:docDefaults><w:rPrDefault>{run_properties}</w:rPrDefault><w:pPrDefault/></w:docDefaults>'
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/>'
+        f'{run_properties}</w:style>'
+        '</w:styles>'
+    )
+
+
+def _run_xml(text, font_name=None, size=None, color=None, bold=None):
+    properties = ""
+    if font_name:
+        properties += _font_xml(font_name)
+    if bold is not None:
+        properties += '<w:b/>' if bold else '<w:b w:val="0"/>'
+    if color:
+        properties += f'<w:color w:val="{color.lstrip("#")}"/>'
+    if size:
+        properties += f'<w:sz w:val="{round(size * 2)}"/>'
+    content = []
+    # Like python-docx's add_run: newlines become line breaks and tabs become tab stops
+    for piece in _LINE_BREAKS.split(_INVALID_XML_CHARS.sub('', text)):
+        if piece == '\t':
+            content.append('<w:tab/>')
+        elif piece in ('\n', '\r', '\r\n'):
+            content.append('<w:br/>')
+        elif piece:
+            content.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+    rpr = f'<w:rPr>{properties}</w:rPr>' if properties else ""
+    return f'<w:r>{rpr}{"".join(content)}</w:r>'
+
+
+class StreamingDocxWriter:
+    """Write a .docx one paragraph at a time.
+
+        with StreamingDocxWriter(path) as writer:
+            writer.add_paragraph([("1. ", "Courier New", 14, None, True), ("Title", ...)], left_indent=0.25)
+
+    Runs are (text, font_name, size_pt, color_hex, bold); None leaves a property to the Normal style.
+    """
+    def __init__(self, path, font_name=DEFAULT_FONT_NAME, font_size=DEFAULT_FONT_SIZE):
+        self.path = path
+        self.paragraph_count = 0
+        self._buffer = []
+        self._buffered = 0
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        try:
+            # Every other part is written up front: the zip can only stream one entry at a time
+            self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+            self._zip.writestr('_rels/.rels', _PACKAGE_RELS)
+            self._zip.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS)
+            self._zip.writestr('word/styles.xml', _styles_xml(font_name, font_size))
+            self._document = self._zip.open('word/document.xml', 'w', force_zip64=True)
+        except BaseException:
+            self._zip.close()
+            raise
+        self._write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<w:document xmlns:w="{_W}" xmlns:r="{_R}"><w:body>')
+
+    def add_paragraph(self, runs, left_indent=None, space_before=None, space_after=None, line_spacing=None, align='left'):
+        """Append one paragraph. left_indent is in inches, spacing in points, line_spacing a multiple (1.5)."""
+        properties = ""
+        if space_before is not None or space_after is not None or line_spacing is not None:
+            spacing = ""
+            if space_before is not None:
+                spacing += f' w:before="{round(space_before * TWIPS_PER_POINT)}"'
+            if space_after is not None:
+                spacing += f' w:after="{round(space_after * TWIPS_PER_POINT)}"'
+            if line_spacing is not None:
+                spacing += f' w:line="{round(line_spacing * LINE_SPACING_UNIT)}" w:lineRule="auto"'
+            properties += f'<w:spacing{spacing}/>'
+        if left_indent is not None:
+            properties += f'<w:ind w:left="{round(left_indent * TWIPS_PER_INCH)}"/>'
+        if align:
+            properties += f'<w:jc w:val="{align}"/>'
+        ppr = f'<w:pPr>{properties}</w:pPr>' if properties else ""
+        self._write(f'<w:p>{ppr}{"".join(_run_xml(*run) for run in runs)}</w:p>')
+        self.paragraph_count += 1
+
+    def close(self):
+        """Finish document.xml and the zip. Safe to call twice."""
+        if self._zip is None:
+            return
+        try:
+            self._write(f'{_SECTION}</w:body></w:document>')
+            self._flush()
+            self._document.close()
+        finally:
+            self._zip.close()
+            self._zip = None
+
+    def abort(self):
+        """Close without finishing the document (the file is left incomplete for the caller to remove)."""
+        if self._zip is None:
+            return
+        try:
+            self._document.close()
+        finally:
+            self._zip.close()
+            self._zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, xml):
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        if self._buffered >= FLUSH_BYTES:
+            self._flush()
+
+    def _flush(self):
+        self._document.write("".join(self._buffer).encode("utf-8"))
+        self._buffer = []
+        self._buffered = 0
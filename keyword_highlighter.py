@@ -0,0 +1,65 @@
+# Keyword colouring for the DOCX output in a single pass over each paragraph.
+# All keywords are compiled into one regex shaped like a prefix tree, so the regex engine follows
+# one branch per character instead of trying every keyword in turn: per-paragraph cost stays flat
+# whether the dictionary has 100 keywords or 10,000.
+import json
+import re
+
+
+def load_keywords(path):
+    """{keyword: "RRGGBB"} from a JSON file, e.g. {"process": "FFD700", "risk": "#FF0000"}."""
+    with open(path, encoding="utf-8") as f:
+        keywords = json.load(f)
+    if not isinstance(keywords, dict):
+        raise ValueError(f"{path} must hold a JSON object mapping keywords to hex colours.")
+    for keyword, color in keywords.items():
+        if not re.fullmatch(r'#?[0-9a-fA-F]{6}', str(color)):
+            raise ValueError(f"Keyword {keyword!r} in {path} has colour {color!r}; expected RRGGBB hex.")
+    return {keyword: color.lstrip('#').upper() for keyword, color in keywords.items()}
+
+
+def _trie_pattern(node):
+    """Regex for a prefix-tree node; longer keywords are tried before the shorter ones they extend."""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node: # A keyword ends here
+        return f"(?:{pattern})?"
+    return pattern
+
+
+class KeywordHighlighter:
+    def __init__(self, keywords):
+        """keywords: {keyword: "RRGGBB"}. Matching is case-insensitive and on whole words."""
+        self.colors = {}
+        trie = {}
+        for keyword, color in keywords.items():
+            keyword = keyword.strip().lower()
+            if not keyword:
+                continue
+            self.colors[keyword] = color
+            node = trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[""] = True
+        self.pattern = re.compile(r'\b(?:' + _trie_pattern(trie) + r')\b', re.IGNORECASE) if trie else None
+
+    def split(self, text):
+        """[(segment, colour or None), ...] covering text in order; None marks plain text."""
+        if self.pattern is None:
+            return [(text, None)] if text else []
+        segments = []
+        last = 0
+        for match in self.pattern.finditer(text):
+            color = self.colors.get(match.group().lower())
+            if color is None: # Case-insensitive match whose lower() differs, e.g. the Kelvin sign
+                continue
+            start, end = match.span()
+            if start > last:
+                segments.append((text[last:start], None))
+            segments.append((match.group(), color))
+            last = end
+        if last < len(text):
+            segments.append((text[last:], None))
+        return segments
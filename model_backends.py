@@ -0,0 +1,345 @@
+# Model backends the converter can send chunk prompts to, and the router that picks between them.
+#
+# Gemini is always one backend (wrapped by the converter). More can be listed in a JSON file, e.g.
+#   [{"name": "deepseek", "base_url": "https://api.deepseek.com/v1", "model": "deepseek-chat",
+#     "api_key_env": "DEEPSEEK_API_KEY", "max_concurrent": 4}]
+# and pointed to with PRETTYNOTES_BACKENDS_FILE. Anything speaking the OpenAI chat completions API
+# works (DeepSeek, Mistral, a local llama.cpp / vLLM server, ...). A quantized GGUF model can also run
+# inside this process on CPU, with no network at all:
+#   [{"name": "llama", "type": "llama_cpp", "model_path": "models/qwen2.5-1.5b-instruct-q4_k_m.gguf"}]
+# (optionally with "n_ctx", "n_batch", "n_threads" and "max_concurrent")
+# or just PRETTYNOTES_LLAMA_MODEL=path/to/model.gguf (needs `pip install llama-cpp-python`).
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+from telemetry import LLM_CALLS, stage_span
+
+BACKENDS_FILE = os.getenv("PRETTYNOTES_BACKENDS_FILE")
+LLAMA_MODEL_PATH = os.getenv("PRETTYNOTES_LLAMA_MODEL")
+LLAMA_CONTEXT_TOKENS = int(os.getenv("PRETTYNOTES_LLAMA_CONTEXT", "16384")) # Prompt + chunk (CHUNK_TOKEN_BUDGET) + outline
+LLAMA_BATCH_TOKENS = int(os.getenv("PRETTYNOTES_LLAMA_BATCH", "512")) # Prompt tokens evaluated per forward pass
+LLAMA_THREADS = int(os.getenv("PRETTYNOTES_LLAMA_THREADS", str(os.cpu_count() or 1)))
+LATENCY_WINDOW = 50 # Recent calls per backend its p50 latency is taken over
+BREAKER_FAILURE_THRESHOLD = 3 # Consecutive failures that open a backend's circuit
+BREAKER_RESET_SECONDS = 30.0 # How long an open circuit waits before letting one trial call through
+BACKEND_TIMEOUT_SECONDS = 120
+RESERVED_BACKEND_NAMES = ('local', 'raw') # Chunk labels for the local outliner and the raw-text fallback
+
+
+class BackendError(Exception):
+    """A backend could not produce an outline (network, HTTP or API error)."""
+
+
+class EmptyResponse(BackendError):
+    """The backend answered without usable text (e.g. blocked by a safety filter); the backend itself is fine."""
+
+
+class ClientError(BackendError):
+    """The backend refused this request (HTTP 4xx: bad input, quota); the backend itself is fine."""
+
+
+class NoBackendAvailable(BackendError):
+    """The router has no backend to send the call to."""
+
+
+def _is_client_error(error):
+    """ClientError, or any exception carrying a 4xx HTTP status as .code (e.g. google.api_core's InvalidArgument, ResourceExhausted)."""
+    code = getattr(error, 'code', None)
+    return isinstance(error, ClientError) or (isinstance(code, int) and 400 <= code < 500)
+
+
+class CircuitBreaker:
+    """closed -> (BREAKER_FAILURE_THRESHOLD failures in a row) -> open -> (after reset_seconds) -> half-open.
+
+    Half-open lets a single trial call through: success closes the circuit, failure opens it again.
+    """
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def state(self, now=None):
+        if self.opened_at is None:
+            return 'closed'
+        if (now or time.monotonic()) - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go to this backend now (claims the trial call when half-open)."""
+        state = self.state()
+        if state == 'closed':
+            return True
+        if state == 'half-open' and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def release(self):
+        """The call said nothing about the backend's health (e.g. a client error); just free the trial slot."""
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class BackendStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FunctionBackend:
+    """Backend around a generate(prompt, chunk_num) -> text function (the converter wraps Gemini this way)."""
+    def __init__(self, name, generate, max_concurrent=4):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._generate = generate
+
+    def generate(self, prompt, chunk_num=None):
+        return self._generate(prompt, chunk_num)
+
+
+class OpenAICompatibleBackend:
+    """Any server implementing POST {base_url}/chat/completions."""
+    def __init__(self, name, base_url, model, api_key=None, max_concurrent=4, timeout=BACKEND_TIMEOUT_SECONDS, max_tokens=8192):
+        self.name = name
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.api_key = api_key
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+
+    def generate(self, prompt, chunk_num=None):
+        # Same sampling settings the converter uses with Gemini
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2,
+            "top_p": 0.8,
+            "max_tokens": self.max_tokens,
+        }
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            error = ClientError if 400 <= e.code < 500 else BackendError
+            raise error(f"{self.name}: HTTP {e.code} {e.reason}") from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise BackendError(f"{self.name}: {e}") from e
+        choices = body.get("choices") or []
+        text = ((choices[0].get("message") or {}).get("content") or "").strip() if choices else ""
+        if not text:
+            raise EmptyResponse(f"{self.name} returned an empty outline")
+        return text
+
+
+# Loaded llama.cpp models by (path, context, batch, threads): loading takes seconds and a lot of RAM,
+# so a model stays loaded for the life of the process however many converters the pool builds.
+_LLAMA_MODELS = {}
+_LLAMA_MODELS_LOCK = threading.Lock()
+
+
+class LlamaCppBackend:
+    """A quantized GGUF model run on this machine's CPU through llama-cpp-python."""
+    def __init__(self, name, model_path, n_ctx=LLAMA_CONTEXT_TOKENS, n_batch=LLAMA_BATCH_TOKENS, n_threads=LLAMA_THREADS, max_tokens=None, max_concurrent=1):
+        self.name = name
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.n_threads = n_threads
+        self.max_tokens = max_tokens # None: until the model stops or the context is full
+        self.max_concurrent = max_concurrent # One generation at a time already uses every thread; more calls queue on the model
+        # Running totals, for throughput reporting
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prompt_seconds = 0.0
+        self.generation_seconds = 0.0
+
+    def load(self):
+        """The shared llama_cpp.Llama for this model, loading it on first use (call at startup to warm up)."""
+        key = (os.path.abspath(self.model_path), self.n_ctx, self.n_batch, self.n_threads)
+        with _LLAMA_MODELS_LOCK:
+            if key not in _LLAMA_MODELS:
+                try:
+                    from llama_cpp import Llama
+                except ImportError as e:
+                    raise BackendError(f"{self.name}: llama-cpp-python is not installed (pip install llama-cpp-python)") from e
+                print(f"Loading local model {self.model_path} ({self.n_threads} threads, {self.n_ctx}-token context)...")
+                model = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_batch=self.n_batch, n_threads=self.n_threads, verbose=False)
+                # llama.cpp contexts are not thread-safe; every backend sharing the model takes this lock
+                _LLAMA_MODELS[key] = (model, threading.Lock())
+            return _LLAMA_MODELS[key]
+
+    def generate(self, prompt, chunk_num=None):
+        model, model_lock = self.load()
+        with model_lock:
+            start_time = time.monotonic()
+            first_token_time = None
+            pieces = []
+            try:
+                # Streamed so prompt evaluation (until the first token) and generation can be timed separately
+                for chunk in model.create_chat_completion(
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.2, top_p=0.8, max_tokens=self.max_tokens, stream=True,
+                ):
+                    piece = chunk["choices"][0]["delta"].get("content")
+                    if piece:
+                        first_token_time = first_token_time or time.monotonic()
+                        pieces.append(piece)
+            except (ValueError, RuntimeError) as e: # e.g. the prompt does not fit the context window
+                raise BackendError(f"{self.name}: {e}") from e
+            end_time = time.monotonic()
+            self.prompt_tokens += len(model.tokenize(prompt.encode("utf-8")))
+            self.completion_tokens += len(pieces)
+            self.prompt_seconds += (first_token_time or end_time) - start_time
+            self.generation_seconds += end_time - (first_token_time or end_time)
+        text = "".join(pieces).strip()
+        if not text:
+            raise EmptyResponse(f"{self.name} returned an empty outline")
+        return text
+
+
+def load_backends(path=BACKENDS_FILE, llama_model_path=LLAMA_MODEL_PATH):
+    """Backends listed in a JSON file (see the top of this module) plus PRETTYNOTES_LLAMA_MODEL; [] without either."""
+    entries = []
+    if path:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    if llama_model_path:
+        entries.append({"name": "llama", "type": "llama_cpp", "model_path": llama_model_path})
+    backends = []
+    for entry in entries:
+        if entry["name"] in RESERVED_BACKEND_NAMES:
+            raise ValueError(f"Backend name {entry['name']!r} is reserved; {', '.join(RESERVED_BACKEND_NAMES)} label chunks not written by a model.")
+        if entry.get("type") == "llama_cpp":
+            backends.append(LlamaCppBackend(
+                entry["name"], entry["model_path"],
+                n_ctx=entry.get("n_ctx", LLAMA_CONTEXT_TOKENS), n_batch=entry.get("n_batch", LLAMA_BATCH_TOKENS),
+                n_threads=entry.get("n_threads", LLAMA_THREADS), max_concurrent=entry.get("max_concurrent", 1),
+            ))
+            continue
+        api_key = os.getenv(entry["api_key_env"]) if entry.get("api_key_env") else entry.get("api_key")
+        backends.append(OpenAICompatibleBackend(
+            entry["name"], entry["base_url"], entry["model"], api_key=api_key,
+            max_concurrent=entry.get("max_concurrent", 4),
+        ))
+    return backends
+
+
+class BackendRouter:
+    def __init__(self, backends):
+        """Send each prompt to the healthy backend with the lowest recent p50 latency that has a free slot."""
+        self.backends = list(backends)
+        self._lock = threading.Lock()
+        self._stats = {backend.name: BackendStats() for backend in self.backends}
+        self._breakers = {backend.name: CircuitBreaker() for backend in self.backends}
+
+    def generate(self, prompt, chunk_num=None):
+        """Return (text, backend name), failing over to the next backend when one errors."""
+        tried = set()
+        last_error = None
+        while True:
+            backend = self._pick(tried)
+            if backend is None:
+                raise last_error or NoBackendAvailable("No model backend is configured.")
+            tried.add(backend.name)
+            start_time = time.monotonic()
+            try:
+                with stage_span('llm_call', backend=backend.name, chunk=chunk_num):
+                    text = backend.generate(prompt, chunk_num)
+            except EmptyResponse as e:
+                # A reply, just not a usable one: another model may still manage, but this one is healthy
+                self._finish(backend, None, failed=False)
+                LLM_CALLS.inc(backend=backend.name, outcome='empty')
+                last_error = e
+            except Exception as e:
+                # A refused request (bad input, quota) is failed over but doesn't count against the backend's circuit
+                self._finish(backend, start_time, failed=None if _is_client_error(e) else True)
+                LLM_CALLS.inc(backend=backend.name, outcome='error')
+                print(f"Backend {backend.name} failed ({e}); "
+                      f"{'failing over' if len(tried) < len(self.backends) else 'no backends left'}.")
+                last_error = e
+            else:
+                self._finish(backend, start_time, failed=False)
+                LLM_CALLS.inc(backend=backend.name, outcome='ok')
+                return text, backend.name
+
+    def _pick(self, tried):
+        with self._lock:
+            candidates = [b for b in self.backends if b.name not in tried and self._breakers[b.name].state() != 'open']
+            # Prefer backends with spare quota; if all are busy, queue on the fastest
+            with_quota = [b for b in candidates if self._stats[b.name].in_flight < b.max_concurrent]
+            # Backends without latency samples yet go first, so every backend gets measured
+            for backend in sorted(with_quota or candidates, key=lambda b: self._stats[b.name].percentile(0.5) or 0.0):
+                if self._breakers[backend.name].allow():
+                    self._stats[backend.name].in_flight += 1
+                    return backend
+            # Every circuit is open (or its one trial call is taken). With nothing left to fail over to, skipping the
+            # backend would only drop the chunk, so a call that hasn't tried anything yet goes to the one opened longest ago.
+            untried = [b for b in self.backends if b.name not in tried]
+            if tried or not untried:
+                return None
+            backend = min(untried, key=lambda b: self._breakers[b.name].opened_at or 0.0)
+            self._stats[backend.name].in_flight += 1
+            return backend
+
+    def _finish(self, backend, start_time, failed):
+        """failed: True (counts against the circuit), False (a healthy reply) or None (a client error, neither)."""
+        with self._lock:
+            stats = self._stats[backend.name]
+            stats.in_flight -= 1
+            stats.calls += 1
+            if failed is None:
+                stats.failures += 1
+                self._breakers[backend.name].release()
+            elif failed:
+                stats.failures += 1
+                self._breakers[backend.name].record_failure()
+            else:
+                if start_time is not None: # Empty replies say nothing about how fast real outlines come back
+                    stats.latencies.append(time.monotonic() - start_time)
+                self._breakers[backend.name].record_success()
+
+    def metrics(self):
+        """{backend name: {'calls', 'failures', 'in_flight', 'p50_seconds', 'p95_seconds', 'breaker'}}"""
+        with self._lock:
+            return {
+                backend.name: {
+                    'calls': self._stats[backend.name].calls,
+                    'failures': self._stats[backend.name].failures,
+                    'in_flight': self._stats[backend.name].in_flight,
+                    'p50_seconds': self._stats[backend.name].percentile(0.5),
+                    'p95_seconds': self._stats[backend.name].percentile(0.95),
+                    'breaker': self._breakers[backend.name].state(),
+                }
+                for backend in self.backends
+            }
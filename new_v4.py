@@ -1240,20 +1240,70 @@
 # UPDATED CODE AS OF 12:45AM MAY 25 2025
 
 # CHANGELOG: may change data if any errors found, lexical errors and semantics are taken care of.
+import hashlib
+import json
 import os
 import re
-import fitz  # PyMuPDF
-import google.generativeai as genai
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.dml import MSO_THEME_COLOR # For line spacing
-from docx.enum.text import WD_LINE_SPACING # For line spacing
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+import random
+import shutil
+import string
+import threading
+import time
+import multiprocessing
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from outline_cache import OutlineCache, TokenCountCache, OcrCache, PageGroupIndex
+from preservation import check_preservation
+from docx_stream import StreamingDocxWriter
+from keyword_highlighter import KeywordHighlighter, load_keywords
+from model_backends import BackendRouter, EmptyResponse, FunctionBackend, load_backends
+from rate_limiter import RateLimiter, SHARED_RATE_LIMIT, default_rate_limit_path
+from prompt_cache import GeminiPromptCache, CONTEXT_CACHE_ENABLED, context_cache_unusable
+from telemetry import CONVERSIONS, Stopwatch, carry_context, record_stage, stage_span
+# fitz (PyMuPDF), google.generativeai and docx are imported inside the methods that use them,
+# so importing this module (e.g. from batch workers or app.py) stays fast.
 
 # Configuration for chunking
-MAX_CHARS_PER_CHUNK = 12000 # Keep in mind Gemini's token limits, this might need adjustment
+# Outlines reproduce their chunk almost word for word, so the output cap (not the context window) bounds a chunk
+MAX_OUTPUT_TOKENS = 8192
+CHUNK_TOKEN_BUDGET = int(os.getenv("PRETTYNOTES_CHUNK_TOKENS", "5000")) # Headroom for outline markers and corrections
+CHUNK_TOKEN_LIMIT = (CHUNK_TOKEN_BUDGET + MAX_OUTPUT_TOKENS) // 2 # Pages are packed by estimate; a chunk Gemini counts above this is split
+CHARS_PER_TOKEN_ESTIMATE = 4 # For ASCII text; other characters are estimated at a token each
+HEADING_FONT_RATIO = 1.15 # Blocks set this much larger than the page's body text count as (level 2) headings
+HEADING_1_FONT_RATIO = 1.5 # ... and this much larger as level 1 headings
+HEADING_MAX_CHARS = 200
+HEADING_BREAK_MIN_FILL = 0.5 # Start a new chunk at a heading once the current one is at least this full
+
+# Model configuration
+DEFAULT_MODEL_NAME = 'gemini-1.5-flash-latest'
+PROMPT_VERSION = '2025-05-25-shared-instructions' # Bump whenever the formatting prompt changes so cached outlines are invalidated
+CONVERTER_VERSION = '4.4' # Bump whenever DOCX rendering changes so stored outputs are invalidated
+
+# Outline engines: 'gemini' formats every chunk with the LLM, 'local' builds outlines from the PDF's own
+# structure (no API calls), 'auto' does that too but sends chunks it is unsure about to Gemini
+OUTLINE_ENGINES = ('gemini', 'local', 'auto')
+OUTLINE_ENGINE = os.getenv("PRETTYNOTES_ENGINE", "gemini")
+LOCAL_OUTLINE_MIN_CONFIDENCE = 0.6 # 'auto' escalates chunks the local outliner scores below this
+LOCAL_BODY_BLOCKS_PER_HEADING = 8 # More paragraphs than this per heading reads as unstructured text
+
+# Concurrency configuration
+MAX_CONCURRENT_CHUNKS = int(os.getenv("PRETTYNOTES_MAX_CONCURRENT_CHUNKS", "4")) # Gemini requests in flight per document
+MAX_CONCURRENT_GEMINI_CALLS = int(os.getenv("PRETTYNOTES_MAX_GEMINI_CALLS", "8")) # Gemini requests in flight per converter, across all documents
+RATE_LIMIT_MAX_RETRIES = 5 # Retries for a chunk that hits a 429 / quota error
+RATE_LIMIT_BASE_DELAY = 2.0 # Seconds, doubled on every retry (plus jitter)
+EXTRACTION_WORKERS = int(os.getenv("PRETTYNOTES_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1)))) # Processes for PDF text extraction
+MIN_PAGES_PER_EXTRACTION_WORKER = 25 # Smaller PDFs are extracted in-process; starting workers would cost more than it saves
+EXTRACTION_BATCH_PAGES = 16 # Pages per extraction worker task
+PIPELINE_CHUNKS_AHEAD = 2 # Chunks allowed to wait per Gemini worker before extraction pauses (backpressure)
+
+# OCR for pages without a text layer (scanned PDFs); needs the tesseract binary on PATH
+OCR_ENABLED = os.getenv("PRETTYNOTES_OCR", "1") != "0"
+OCR_LANGUAGE = os.getenv("PRETTYNOTES_OCR_LANGUAGE", "eng") # Tesseract language(s), e.g. "eng+deu"
+OCR_WORKERS = int(os.getenv("PRETTYNOTES_OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_DPI = 300
+OCR_MIN_CHARS = 20 # Pages with images and less text than this are OCR'd
+OCR_READ_AHEAD_PAGES = 16 # Pages read past one still being OCR'd, so later scanned pages are OCR'd in parallel
 
 # --- Style Configuration (remains the same) ---
 HIERARCHY_MARKER_FONT_NAME = 'Courier New'
@@ -1289,137 +1339,22 @@ KEYWORDS_TO_HIGHLIGHT = {
     "primary": "FF8C00", "secondary": "FF8C00", "main": "FF8C00", "key": "FF8C00",
     "important": "FF8C00", "critical": "FF8C00", "essential": "FF8C00", "significant": "FF8C00",
 }
+# A JSON file of {keyword: "RRGGBB"} replaces the list above
+KEYWORDS_FILE = os.getenv("PRETTYNOTES_KEYWORDS_FILE")
+if KEYWORDS_FILE:
+    KEYWORDS_TO_HIGHLIGHT = load_keywords(KEYWORDS_FILE)
 DEFAULT_TEXT_COLOR = "000000"
 BULLET_PREFIX = "|-- "
 # --- End Style Configuration ---
 
-class GeminiContentPreservingConverter:
-    def __init__(self, api_key=None):
-        """Initialize the converter with the Gemini API"""
-        try:
-            if not api_key:
-                raise ValueError("Gemini API key not provided.")
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash-latest')
-            print("Gemini client configured successfully.")
-        except Exception as e:
-            print(f"Failed to configure Gemini client: {e}")
-            print("Please ensure the GEMINI_API_KEY is passed correctly.")
-            raise
-
-    def _format_text_for_docx(self, paragraph, text_content, text_font_name, text_color, is_bold=False):
-        """Applies keyword highlighting and styling to a docx paragraph."""
-        if not text_content:
-            return
-
-        temp_text = text_content
-        
-        sorted_keywords = sorted(KEYWORDS_TO_HIGHLIGHT.keys(), key=len, reverse=True)
-
-        matches = []
-        for keyword in sorted_keywords:
-            pattern = r'\b(' + re.escape(keyword) + r')\b'
-            for match in re.finditer(pattern, temp_text, re.IGNORECASE):
-                matches.append((match.start(), match.end(), match.group(1), KEYWORDS_TO_HIGHLIGHT[keyword]))
-        
-        matches.sort(key=lambda x: x[0])
-
-        last_idx = 0
-        for start, end, matched_word, color in matches:
-            if start > last_idx:
-                run = paragraph.add_run(temp_text[last_idx:start])
-                run.font.name = text_font_name
-                run.font.size = Pt(BODY_FONT_SIZE)
-                run.font.color.rgb = self._hex_to_rgb(DEFAULT_TEXT_COLOR)
-                run.bold = is_bold
-            
-            run = paragraph.add_run(matched_word)
-            run.font.name = text_font_name
-            run.font.size = Pt(BODY_FONT_SIZE)
-            run.font.color.rgb = self._hex_to_rgb(color)
-            run.bold = True
-            
-            last_idx = end
-        
-        if last_idx < len(temp_text):
-            run = paragraph.add_run(temp_text[last_idx:])
-            run.font.name = text_font_name
-            run.font.size = Pt(BODY_FONT_SIZE)
-            run.font.color.rgb = self._hex_to_rgb(DEFAULT_TEXT_COLOR)
-            run.bold = is_bold
-            
-        if not paragraph.runs and text_content:
-            run = paragraph.add_run(text_content)
-            run.font.name = text_font_name
-            run.font.size = Pt(BODY_FONT_SIZE)
-            run.font.color.rgb = self._hex_to_rgb(DEFAULT_TEXT_COLOR)
-            run.bold = is_bold
-
-    def _hex_to_rgb(self, hex_color):
-        """Converts a hex color string (e.g., "RRGGBB") to an RGB object for python-docx."""
-        from docx.shared import RGBColor
-        hex_color = hex_color.lstrip('#')
-        return RGBColor(int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16))
-
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text content from all pages of a PDF."""
-        print(f"Extracting text from PDF: {pdf_path}")
-        try:
-            doc = fitz.open(pdf_path)
-            full_text = []
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                full_text.append(page.get_text("text"))
-            doc.close()
-            extracted_text = "\n".join(full_text)
-            if not extracted_text.strip():
-                print("Warning: No text extracted from the PDF. The PDF might be image-based or empty.")
-            return extracted_text
-        except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
-            return None
-
-    def split_text_into_chunks(self, text, max_chars=MAX_CHARS_PER_CHUNK):
-        """Splits text into chunks, trying to respect paragraph boundaries."""
-        chunks = []
-        current_chunk_paras = []
-        current_length = 0
-        paragraphs = text.split('\n\n')
-
-        for para_idx, paragraph in enumerate(paragraphs):
-            para_len = len(paragraph)
-            if current_length + para_len + (2 if current_chunk_paras else 0) <= max_chars:
-                current_chunk_paras.append(paragraph)
-                current_length += para_len + (2 if current_chunk_paras else 0)
-            else:
-                if current_chunk_paras:
-                    chunks.append("\n\n".join(current_chunk_paras))
-                
-                if para_len > max_chars:
-                    start = 0
-                    while start < para_len:
-                        end = start + max_chars
-                        chunks.append(paragraph[start:end])
-                        start = end
-                    current_chunk_paras = []
-                    current_length = 0
-                else:
-                    current_chunk_paras = [paragraph]
-                    current_length = para_len
-            
-            if para_idx == len(paragraphs) - 1 and current_chunk_paras:
-                chunks.append("\n\n".join(current_chunk_paras))
-        
-        return [chunk for chunk in chunks if chunk.strip()]
-
-    def process_with_gemini(self, text_chunk, chunk_num, total_chunks, original_full_text):
-        """Send a single text chunk to Gemini for FORMATTING and MINOR CORRECTIONS."""
-        if not text_chunk or not text_chunk.strip():
-            print(f"Skipping empty chunk {chunk_num}/{total_chunks}.")
-            return ""
+PRESERVATION_THRESHOLD = 0.8 # Share of original words an outline must keep to pass the check
+PRESERVATION_EVENT_SPANS = 3 # Missing/inserted excerpts carried on each preservation event
+PRESERVATION_RETRIES_PER_CHUNK = int(os.getenv("PRETTYNOTES_PRESERVATION_RETRIES", "2")) # Re-prompts for a chunk that fails the check
+PRESERVATION_RETRY_BUDGET = int(os.getenv("PRETTYNOTES_PRESERVATION_RETRY_BUDGET", "8")) # Re-prompts allowed per document
 
-        # UPDATED PROMPT: Now allows for minor corrections without altering core meaning
-        content_preservation_prompt = """
+# Static part of every chunk prompt; Gemini keeps it in a context cache (see prompt_cache.py), so only the chunk is sent per call.
+# UPDATED PROMPT: Now allows for minor corrections without altering core meaning
+FORMATTING_INSTRUCTIONS = """
         YOU ARE A TEXT FORMATTER AND MINOR ERROR CORRECTOR. YOUR PRIMARY GOAL IS TO ORGANIZE THE PROVIDED TEXT INTO A HIERARCHICAL OUTLINE FORMAT.
 
         CRITICAL RULES:
@@ -1474,8 +1409,557 @@ class GeminiContentPreservingConverter:
         Remember: Your role is to format and correct minor errors, while strictly preserving the original meaning and sequence of information.
         """
 
+# --- Progress events ---
+# process_file(progress_callback=...) reports progress for that one call as dicts with a 'type' key.
+# The callback may be invoked from chunk worker threads, so it must be thread-safe.
+# Extraction and formatting overlap, so 'extracted', 'chunked' and 'cache' arrive once the last page has been read,
+# and chunk_done's total_chunks is None until then.
+EVENT_STAGE = 'stage'               # {'stage': 'extracting' | 'formatting' | 'writing', 'total_pages' (formatting only)}
+EVENT_EXTRACTED = 'extracted'       # {'pages', 'chars'}
+EVENT_CHUNKED = 'chunked'           # {'total_chunks', 'tokens', 'fill_ratio'}
+EVENT_CACHE = 'cache'               # {'hits', 'misses', 'total_chunks'}
+EVENT_CHUNK_DONE = 'chunk_done'     # {'chunk', 'total_chunks', 'chars', 'page', 'outline', 'cached', 'engine' (the model backend's name, e.g. 'gemini', or 'local' | 'raw')}
+EVENT_PRESERVATION = 'preservation' # {'chunk', 'ratio', 'passed', 'missing', 'inserted' (first few text spans)}, final outline only
+EVENT_RETRY = 'retry'               # {'chunk', 'attempts', 'seconds', 'ratio', 'outcome' ('passed' | 'raw_text')}
+EVENT_QUOTA_WAIT = 'quota_wait'     # {'chunk', 'seconds' (estimated)}: a Gemini call is queued for the shared rate limit
+EVENT_WARNING = 'warning'           # {'message', 'chunk' (optional)}
+EVENT_ERROR = 'error'               # {'message', 'chunk' (optional)}
+EVENT_METRICS = 'metrics'           # {'elapsed_seconds', 'total_chunks', 'output_path', 'backends' (model_backends.BackendRouter.metrics())}
+# --- End Progress events ---
+
+class ConversionResult:
+    """What process_file produced, so callers never have to re-open the DOCX."""
+    def __init__(self):
+        self.output_path = None # None if no DOCX could be written
+        self.paragraph_count = 0
+        self.empty_outline = True # True when the DOCX only holds a "nothing could be generated" message
+        self.preservation_score = None # Mean per-chunk preservation ratio (0-1), None if no chunk was checked
+        self.total_chunks = 0
+        self.chunk_fill_ratio = None # Mean share of CHUNK_TOKEN_BUDGET each chunk used
+        self.timings = {} # Seconds per stage: extraction, formatting (which overlaps extraction), writing, total
+
+def _normalize_title(text):
+    return " ".join(text.split()).lower()
+
+def _toc_titles(doc):
+    """{page index: {normalized bookmark title: level}} from the PDF's outline (bookmarks)."""
+    titles = {}
+    for level, title, page_num in doc.get_toc():
+        if page_num >= 1:
+            titles.setdefault(page_num - 1, {})[_normalize_title(title)] = level
+    return titles
+
+def _page_blocks(page, toc_titles=None):
+    """(text, heading_level) for each text block on a page, in reading order; level 0 is body text.
+
+    Bookmarked titles take their bookmark level; otherwise the level comes from the font size
+    relative to the page's body text, with bold single lines counting as level 2.
+    """
+    blocks = []
+    size_chars = {}
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:  # Images
+            continue
+        lines = ["".join(span["text"] for span in line["spans"]) for line in block["lines"]]
+        text = "\n".join(lines).strip()
+        if not text:
+            continue
+        spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        for span in spans:
+            size = round(span["size"], 1)
+            size_chars[size] = size_chars.get(size, 0) + len(span["text"])
+        is_bold = all(span["flags"] & 16 for span in spans)
+        blocks.append((text, max(span["size"] for span in spans), is_bold))
+    # The size most of the page's text is set in counts as body text
+    body_size = max(size_chars, key=size_chars.get) if size_chars else 0
+    toc_titles = toc_titles or {}
+
+    page_blocks = []
+    for text, size, is_bold in blocks:
+        level = 0
+        if len(text) <= HEADING_MAX_CHARS:
+            if _normalize_title(text) in toc_titles:
+                level = min(toc_titles[_normalize_title(text)], 2)
+            elif size >= body_size * HEADING_1_FONT_RATIO:
+                level = 1
+            elif size >= body_size * HEADING_FONT_RATIO or (is_bold and "\n" not in text):
+                level = 2
+        page_blocks.append((text, level))
+    return page_blocks
+
+def _page_content(page, blocks, toc_titles=None):
+    """Text (or _page_blocks) of a page, or None if it is a scan with (almost) no text layer and needs OCR."""
+    content = _page_blocks(page, toc_titles) if blocks else page.get_text("text")
+    text = "".join(text for text, _ in content) if blocks else content
+    if len(text.strip()) < OCR_MIN_CHARS and page.get_images():
+        return None
+    return content
+
+def _extract_page_range(pdf_path, start, stop, blocks=False):
+    """_page_content of pages [start, stop); runs in an extraction worker with its own fitz.Document."""
+    import fitz  # PyMuPDF
+    with fitz.open(pdf_path) as doc:
+        toc_titles = _toc_titles(doc) if blocks else {}
+        return [_page_content(doc.load_page(page_num), blocks, toc_titles.get(page_num)) for page_num in range(start, stop)]
+
+_ocr_cache = None # One per OCR worker process
+
+def _ocr_page(pdf_path, page_num, blocks=False):
+    """Rasterize one page and OCR it with Tesseract; runs in an OCR worker. Results are cached by a hash of the page image."""
+    global _ocr_cache
+    import fitz  # PyMuPDF
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc.load_page(page_num).get_pixmap(dpi=OCR_DPI)
+    if _ocr_cache is None:
+        _ocr_cache = OcrCache()
+    key = OcrCache.make_key(pixmap.samples, f"{OCR_LANGUAGE}:{pixmap.width}x{pixmap.height}x{pixmap.n}")
+    page_blocks = _ocr_cache.get(key)
+    if page_blocks is None:
+        # The OCR'd page comes back as a one-page PDF with a text layer, so it gets the same block analysis
+        with fitz.open("pdf", pixmap.pdfocr_tobytes(language=OCR_LANGUAGE)) as ocr_doc:
+            page_blocks = _page_blocks(ocr_doc.load_page(0))
+        _ocr_cache.put(key, page_blocks)
+    return page_blocks if blocks else "\n\n".join(text for text, _ in page_blocks)
+
+def estimate_tokens(text):
+    """Token count estimated locally from the text's length (no API call)."""
+    if not text.strip():
+        return 0
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return (len(text) - non_ascii) // CHARS_PER_TOKEN_ESTIMATE + non_ascii + 1
+
+class TokenBudgetChunker:
+    """Packs PDF pages into chunks of at most token_budget tokens.
+
+    Chunks hold whole pages, breaking early before a page that opens with a heading once the chunk
+    is half full. A page too big for any chunk is split between blocks, then lines.
+
+    With a PageGroupIndex, pages that were chunked together in an earlier conversion (of this or
+    any other upload) are chunked together again. After a small edit, every chunk without the
+    edited pages has the same text as last time and is served from the outline cache.
+    """
+    def __init__(self, token_budget=CHUNK_TOKEN_BUDGET, page_groups=None):
+        self.token_budget = token_budget
+        self.page_groups = page_groups
+        self.page_num = 0
+        self.chunk_tokens = [] # Token count of every chunk produced so far
+        self.regrouped_chunks = 0 # Chunks laid out exactly as in an earlier conversion
+        self._pending = deque() # (page_num, page_hash, blocks, tokens) not yet placed in a chunk
+        self._known_groups = {}
+        self._pages = [] # Pages of the chunk being filled
+        self._tokens = 0
+        self._ready = []
+
+    def feed(self, blocks, page_tokens):
+        """Add the next page's (text, heading_level) blocks and its token count; returns completed (chunk_text, page_num, blocks)."""
+        self.page_num += 1
+        page_hash = hashlib.sha256(json.dumps(blocks).encode("utf-8")).hexdigest()
+        self._pending.append((self.page_num, page_hash, blocks, page_tokens))
+        self._place_pending(finished=False)
+        return self._take_ready()
+
+    def finish(self):
+        """Returns the remaining (chunk_text, page_num, blocks) once every page has been fed."""
+        self._place_pending(finished=True)
+        self._flush_chunk()
+        return self._take_ready()
+
+    def _place_pending(self, finished):
+        while self._pending:
+            group_length = self._match_known_group(finished)
+            if group_length is None:
+                return  # Wait for more pages to tell whether a known group matches
+            if group_length:
+                self._flush_chunk()
+                self._pages = [self._pending.popleft() for _ in range(group_length)]
+                self._tokens = sum(page[3] for page in self._pages)
+                self._flush_chunk()
+                self.regrouped_chunks += 1
+            else:
+                self._add_page(self._pending.popleft())
+
+    def _match_known_group(self, finished):
+        """Length of a known page group starting at the first pending page, 0 if none, None if undecided yet."""
+        if self.page_groups is None:
+            return 0
+        first_hash = self._pending[0][1]
+        if first_hash not in self._known_groups:
+            self._known_groups[first_hash] = self.page_groups.get(first_hash)
+        pending_hashes = [page[1] for page in self._pending]
+        pending_tokens = [page[3] for page in self._pending]
+        undecided = False
+        for group in self._known_groups[first_hash]: # Longest first
+            if len(group) > len(pending_hashes):
+                undecided = undecided or (not finished and group[:len(pending_hashes)] == pending_hashes)
+            elif pending_hashes[:len(group)] == group and sum(pending_tokens[:len(group)]) <= self.token_budget:
+                return len(group)
+        return None if undecided else 0
+
+    def _add_page(self, page):
+        blocks, tokens = page[2], page[3]
+        if tokens > self.token_budget:
+            self._flush_chunk()
+            self._split_page(page)
+            return
+        opens_with_heading = bool(blocks) and blocks[0][1]
+        if self._tokens + tokens > self.token_budget or (opens_with_heading and self._tokens >= self.token_budget * HEADING_BREAK_MIN_FILL):
+            self._flush_chunk()
+        self._pages.append(page)
+        self._tokens += tokens
+
+    def _split_page(self, page):
+        """Chunks for a page over the budget, packing its blocks (and pieces of oversized blocks) in order."""
+        page_num, _, blocks, page_tokens = page
+        page_chars = sum(len(text) for text, _ in blocks) or 1
+        pieces = []
+        for text, level in blocks:
+            # Blocks get the page's exact count in proportion to their length
+            tokens = page_tokens * len(text) / page_chars
+            if tokens > self.token_budget:
+                pieces.extend(((piece, level), piece_tokens) for piece, piece_tokens in self._split_block(text, tokens))
+            else:
+                pieces.append(((text, level), tokens))
+        chunk_blocks = []
+        tokens = 0
+        for block, piece_tokens in pieces:
+            if chunk_blocks and tokens + piece_tokens > self.token_budget:
+                self._add_chunk(chunk_blocks, tokens, page_num)
+                chunk_blocks = []
+                tokens = 0
+            chunk_blocks.append(block)
+            tokens += piece_tokens
+        if chunk_blocks:
+            self._add_chunk(chunk_blocks, tokens, page_num)
+
+    def _split_block(self, text, tokens):
+        max_chars = max(1, int(len(text) * self.token_budget / tokens))
+        pieces = []
+        current = ""
+        for line in text.split("\n"):
+            while len(line) > max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(line[:max_chars])
+                line = line[max_chars:]
+            if current and len(current) + 1 + len(line) > max_chars:
+                pieces.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            pieces.append(current)
+        return [(piece, tokens * len(piece) / len(text)) for piece in pieces]
+
+    def _flush_chunk(self):
+        if self._pages:
+            self._add_chunk([block for page in self._pages for block in page[2]], self._tokens, self._pages[-1][0])
+            if self.page_groups is not None:
+                self.page_groups.put([page[1] for page in self._pages])
+        self._pages = []
+        self._tokens = 0
+
+    def _add_chunk(self, blocks, tokens, page_num):
+        chunk = "\n\n".join(text for text, _ in blocks)
+        if chunk.strip():
+            self._ready.append((chunk, page_num, blocks))
+            self.chunk_tokens.append(round(tokens))
+
+    def _take_ready(self):
+        ready = self._ready
+        self._ready = []
+        return ready
+
+class LocalOutliner:
+    """Builds the "1. / 1.a. / |--" outline straight from a chunk's PDF structure, without calling Gemini.
+
+    Level 1 headings become sections, level 2 headings subsections, and body text becomes one bullet
+    per sentence (list items keep their own marker and sit one level deeper). Unlike Gemini it fixes
+    no typos and invents no structure, so confidence() says how much the outline can be trusted.
+    """
+    LIST_ITEM = re.compile(r'^(?:[-•▪◦*–]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+')
+    SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"(])')
+
+    def outline(self, blocks):
+        """Outline text for a chunk's (text, heading_level) blocks."""
+        lines = []
+        section_num = 0
+        subsection_num = 0
+        bullet_indent = 0
+        for text, level in blocks:
+            title = " ".join(text.split())
+            if level == 1 or (level == 2 and section_num == 0):
+                section_num += 1
+                subsection_num = 0
+                bullet_indent = 0
+                lines.append(f"{section_num}. {title}")
+            elif level == 2:
+                subsection_num += 1
+                bullet_indent = 2
+                letter = string.ascii_lowercase[(subsection_num - 1) % 26]
+                lines.append(f"  {section_num}.{letter}. {title}")
+            else:
+                for item, is_list_item in self._items(text):
+                    indent = bullet_indent + (2 if is_list_item else 0)
+                    lines.append(f"{' ' * indent}{BULLET_PREFIX}{item}")
+        return "\n".join(lines)
+
+    def confidence(self, blocks):
+        """0-1: low for walls of text without headings (Gemini structures those better) or garbled text (bad OCR)."""
+        text = "".join(text for text, _ in blocks)
+        if not text.strip():
+            return 0.0
+        body_blocks = sum(1 for _, level in blocks if not level)
+        headings = len(blocks) - body_blocks
+        structure = min(1.0, headings * LOCAL_BODY_BLOCKS_PER_HEADING / body_blocks) if body_blocks else 1.0
+        clean = sum(ch.isalnum() or ch.isspace() or ch in ".,;:!?'\"()-" for ch in text) / len(text)
+        return structure * clean
+
+    def _items(self, text):
+        """(bullet text, is_list_item) for a body block: list items as-is, other paragraphs split into sentences."""
+        # Undo hyphenation at line breaks, then rejoin wrapped lines into paragraphs and list items
+        text = re.sub(r'(?<=[a-z])-\n(?=[a-z])', '', text)
+        paragraphs = []
+        for line in text.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            if self.LIST_ITEM.match(line) or not paragraphs:
+                paragraphs.append([line, bool(self.LIST_ITEM.match(line))])
+            else:
+                paragraphs[-1][0] += " " + line
+        items = []
+        for paragraph, is_list_item in paragraphs:
+            if is_list_item:
+                items.append((paragraph, True))
+            else:
+                items.extend((sentence, False) for sentence in self.SENTENCE_END.split(paragraph) if sentence)
+        return items
+
+def output_version(model_name=DEFAULT_MODEL_NAME, engine=OUTLINE_ENGINE):
+    """Everything that affects a finished DOCX, used to key stored outputs."""
+    keywords_hash = hashlib.sha256(json.dumps(KEYWORDS_TO_HIGHLIGHT, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    return f"{CONVERTER_VERSION}:{PROMPT_VERSION}:{model_name}:{engine}:{keywords_hash}"
+
+class GeminiContentPreservingConverter:
+    def __init__(self, api_key=None, model_name=DEFAULT_MODEL_NAME, api_endpoint=None, max_concurrent_chunks=MAX_CONCURRENT_CHUNKS, use_cache=True, max_concurrent_calls=MAX_CONCURRENT_GEMINI_CALLS, extraction_workers=EXTRACTION_WORKERS, ocr_workers=OCR_WORKERS, engine=OUTLINE_ENGINE, keywords=None, backends=None, rate_limiter=None):
+        """Initialize the converter with the Gemini API (not needed for engine='local').
+
+        keywords: {keyword: "RRGGBB"} to colour in the DOCX, KEYWORDS_TO_HIGHLIGHT by default.
+        backends: extra model backends (see model_backends.py) chunks may be routed to besides Gemini;
+        by default those listed in PRETTYNOTES_BACKENDS_FILE.
+        rate_limiter: RateLimiter every Gemini call waits on; by default one per model, shared with
+        other processes through SQLite (see rate_limiter.py).
+        """
+        import google.generativeai as genai
+        try:
+            if engine not in OUTLINE_ENGINES:
+                raise ValueError(f"Unknown outline engine {engine!r}; expected one of {', '.join(OUTLINE_ENGINES)}.")
+            self.engine = engine
+            self.local_outliner = LocalOutliner()
+            self.highlighter = KeywordHighlighter(KEYWORDS_TO_HIGHLIGHT if keywords is None else keywords)
+            extra_backends = load_backends() if backends is None else list(backends)
+            if not api_key and engine != 'local' and not extra_backends:
+                raise ValueError("Gemini API key not provided.")
+            # api_endpoint lets benchmarks point the client at a local fake Gemini server
+            api_endpoint = api_endpoint or os.getenv("GEMINI_API_ENDPOINT")
+            if api_key and api_endpoint:
+                genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": api_endpoint})
+            elif api_key:
+                genai.configure(api_key=api_key)
+            self.model_name = model_name
+            self.max_concurrent_chunks = max(1, max_concurrent_chunks)
+            self.extraction_workers = max(1, extraction_workers)
+            self.ocr_workers = max(1, ocr_workers)
+            # Shared by every request using this (pooled) converter, keeping total calls within the API quota
+            self._gemini_call_slots = threading.BoundedSemaphore(max(1, max_concurrent_calls))
+            if rate_limiter is None:
+                rate_limiter = RateLimiter(shared_path=default_rate_limit_path() if SHARED_RATE_LIMIT else None, scope=model_name)
+            self.rate_limiter = rate_limiter
+            self._call_context = threading.local() # Per-thread request state: user and emit for Gemini calls, the highlighting stopwatch
+            self.cache_version = ":".join([PROMPT_VERSION, model_name] + sorted(backend.name for backend in extra_backends))
+            self.outline_cache = OutlineCache() if use_cache else None
+            self.token_counts = TokenCountCache() if use_cache else None
+            self.page_groups = PageGroupIndex() if use_cache else None
+            self.model = genai.GenerativeModel(model_name) if api_key else None
+            self.prompt_cache = None
+            if api_key and CONTEXT_CACHE_ENABLED:
+                reason = context_cache_unusable(model_name, estimate_tokens(FORMATTING_INSTRUCTIONS))
+                if reason:
+                    print(f"Not using Gemini context caching: {reason}.")
+                else:
+                    self.prompt_cache = GeminiPromptCache(model_name, FORMATTING_INSTRUCTIONS)
+            gemini_backends = [FunctionBackend('gemini', self._gemini_outline, max_concurrent=max(1, max_concurrent_calls))] if api_key else []
+            self.router = BackendRouter(gemini_backends + extra_backends)
+            print("Gemini client configured successfully." if api_key else "Running without Gemini (local outline engine only).")
+        except Exception as e:
+            print(f"Failed to configure Gemini client: {e}")
+            print("Please ensure the GEMINI_API_KEY is passed correctly.")
+            raise
+
+    def health_check(self):
+        """Cheap metadata call to confirm the API key and model are still usable."""
+        import google.generativeai as genai
+        if self.model is None:
+            return True
+        try:
+            genai.get_model(f"models/{self.model_name}")
+            return True
+        except Exception as e:
+            print(f"Gemini health check failed for {self.model_name}: {e}")
+            return False
+
+    def _highlighted_runs(self, text_content, text_font_name, text_color, is_bold=False):
+        """Split text into (text, font, size, color, bold) runs for StreamingDocxWriter, colouring keywords (in bold)."""
+        with getattr(self._call_context, 'highlight_clock', None) or nullcontext():
+            return [
+                (segment, text_font_name, BODY_FONT_SIZE, color or text_color, bool(color) or is_bold)
+                for segment, color in self.highlighter.split(text_content or "")
+            ]
+
+    def count_tokens(self, text):
+        """Gemini's token count for text, cached by content; estimated from its length if counting fails."""
+        if not text.strip():
+            return 0
+        key = TokenCountCache.make_key(text, self.model_name)
+        tokens = self.token_counts.get(key) if self.token_counts is not None else None
+        if tokens is None and self.model is None:
+            return estimate_tokens(text)
+        if tokens is None:
+            try:
+                tokens = self.model.count_tokens(text).total_tokens
+            except Exception as e:
+                print(f"Token count failed ({e}); estimating from text length.")
+                return estimate_tokens(text)
+            if self.token_counts is not None:
+                self.token_counts.put(key, tokens)
+        return tokens
+
+    def verified_chunks(self, chunk_text, page_num, blocks):
+        """Gemini's count for a chunk packed by estimate; (chunk_text, page_num, blocks, tokens) for it, or for its
+        halves (split again as needed) if it is over CHUNK_TOKEN_LIMIT."""
+        tokens = self.count_tokens(chunk_text)
+        if tokens <= CHUNK_TOKEN_LIMIT or len(chunk_text) < 2:
+            return [(chunk_text, page_num, blocks, tokens)]
+        print(f"Chunk ending on page {page_num} counts {tokens} tokens, over {CHUNK_TOKEN_LIMIT}; splitting it.")
+        if len(blocks) > 1:
+            # Between blocks, as near the middle of the text as possible
+            half, length, cut = len(chunk_text) / 2, 0, 1
+            for cut in range(1, len(blocks)):
+                length += len(blocks[cut - 1][0]) + 2
+                if length >= half:
+                    break
+            halves = [blocks[:cut], blocks[cut:]]
+        else:
+            text, level = blocks[0]
+            cut = text.rfind("\n", 0, len(text) // 2) + 1 or len(text) // 2
+            halves = [[(text[:cut].rstrip("\n"), level)], [(text[cut:], level)]]
+        return [piece for half in halves
+                for piece in self.verified_chunks("\n\n".join(text for text, _ in half), page_num, half)]
+
+    def count_pdf_pages(self, pdf_path):
+        import fitz  # PyMuPDF
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+
+    def iter_pdf_pages(self, pdf_path, blocks=False):
+        """Yield the text (or, with blocks=True, the (text, heading_level) blocks) of each page in order.
+
+        Pages with a text layer take the fast path. Scanned pages are rasterized and OCR'd in worker
+        processes while the following pages are read, so mixed documents only pay for OCR where needed.
+        """
+        pending = deque() # Page content, or a Future for a page being OCR'd
+        ocr_executor = None
+        skipped_pages = 0
+        try:
+            for page_num, content in enumerate(self._iter_text_layer(pdf_path, blocks)):
+                if content is None:
+                    if ocr_executor is None and OCR_ENABLED and shutil.which("tesseract"):
+                        print(f"Page {page_num + 1} has no text layer; starting OCR with {self.ocr_workers} worker processes.")
+                        ocr_executor = ProcessPoolExecutor(max_workers=self.ocr_workers, mp_context=multiprocessing.get_context("spawn"))
+                    if ocr_executor is not None:
+                        content = ocr_executor.submit(_ocr_page, pdf_path, page_num, blocks)
+                    else:
+                        skipped_pages += 1
+                        content = [] if blocks else ""
+                pending.append(content)
+                while pending and (not isinstance(pending[0], Future) or pending[0].done() or len(pending) > OCR_READ_AHEAD_PAGES):
+                    head = pending.popleft()
+                    yield head.result() if isinstance(head, Future) else head
+            while pending:
+                head = pending.popleft()
+                yield head.result() if isinstance(head, Future) else head
+            if skipped_pages:
+                print(f"Skipped {skipped_pages} page(s) with no text layer: OCR is disabled or Tesseract is not installed.")
+        finally:
+            if ocr_executor is not None:
+                ocr_executor.shutdown(cancel_futures=True)
+
+    def _iter_text_layer(self, pdf_path, blocks):
+        """_page_content of each page in order, reading ahead no more than a few page batches."""
+        import fitz  # PyMuPDF
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+            workers = min(self.extraction_workers, page_count // MIN_PAGES_PER_EXTRACTION_WORKER)
+            if workers <= 1:
+                toc_titles = _toc_titles(doc) if blocks else {}
+                for page_num in range(page_count):
+                    yield _page_content(doc.load_page(page_num), blocks, toc_titles.get(page_num))
+                return
+
+        # Page batches go to worker processes, each with its own fitz.Document, and come back in page order.
+        # Spawned (not forked) workers, since the caller may hold gRPC or Gradio threads.
+        print(f"Extracting {page_count} pages with {workers} worker processes.")
+        batches = iter(range(0, page_count, EXTRACTION_BATCH_PAGES))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            def submit_next():
+                start = next(batches, None)
+                if start is not None:
+                    in_flight.append(executor.submit(_extract_page_range, pdf_path, start, min(start + EXTRACTION_BATCH_PAGES, page_count), blocks))
+
+            in_flight = deque()
+            for _ in range(workers * 2):
+                submit_next()
+            while in_flight:
+                page_texts = in_flight.popleft().result()
+                submit_next()
+                yield from page_texts
+
+    def extract_text_from_pdf(self, pdf_path, emit=None):
+        """Extract text content from all pages of a PDF."""
+        emit = emit or self._make_emitter(None)
+        print(f"Extracting text from PDF: {pdf_path}")
+        try:
+            full_text = list(self.iter_pdf_pages(pdf_path))
+            extracted_text = "\n".join(full_text)
+            emit(EVENT_EXTRACTED, pages=len(full_text), chars=len(extracted_text))
+            if not extracted_text.strip():
+                print("Warning: No text extracted from the PDF. The PDF might be image-based or empty.")
+            return extracted_text
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+            return None
+
+    def process_with_gemini(self, text_chunk, chunk_num, total_chunks, original_full_text, emit=None, missing_spans=None):
+        """Send a single text chunk to Gemini for FORMATTING and MINOR CORRECTIONS; returns the outline ("" if none)."""
+        return self.outline_chunk(text_chunk, chunk_num, total_chunks, emit, missing_spans)[0]
+
+    def outline_chunk(self, text_chunk, chunk_num, total_chunks, emit=None, missing_spans=None):
+        """Send a single text chunk through the model router; returns (outline, name of the backend that answered).
+
+        The outline is "" (and the backend None) if no backend produced one.
+        missing_spans: passages an earlier outline of this chunk left out, named in the prompt when re-trying it.
+        """
+        emit = emit or self._make_emitter(None)
+        # total_chunks is None while the document is still being extracted
+        chunk_position = f"{chunk_num} of {total_chunks}" if total_chunks else f"{chunk_num}"
+        if not text_chunk or not text_chunk.strip():
+            print(f"Skipping empty chunk {chunk_position}.")
+            return "", None
+
+
         chunk_instruction = f"""
-        This is Chunk {chunk_num} of {total_chunks} from a larger document.
+        This is Chunk {chunk_position} from a larger document.
         
         Format and correct ONLY the content in THIS CHUNK. Do not add connecting text between chunks.
         
@@ -1484,52 +1968,187 @@ class GeminiContentPreservingConverter:
         ---
         {text_chunk}
         ---
-        
+        {self._missing_spans_note(missing_spans)}
         Provide ONLY the formatted outline using exact original text (with allowed minor corrections). No additional commentary.
         """
 
-        full_prompt = f"{content_preservation_prompt}\n\n{chunk_instruction}"
+        full_prompt = f"{FORMATTING_INSTRUCTIONS}\n\n{chunk_instruction}"
         
-        print(f"Sending Chunk {chunk_num}/{total_chunks} to Gemini for FORMATTING and CORRECTIONS ({len(text_chunk)} chars)...")
+        print(f"Sending Chunk {chunk_position} for FORMATTING and CORRECTIONS ({len(text_chunk)} chars)...")
         try:
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.2,  # Slightly higher to allow for minor corrections, but still low
-                    top_p=0.8,        # Reduced to limit variation
-                    max_output_tokens=4096
-                )
-            )
-            
-            if not response.candidates:
-                if hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
-                    print(f"Warning: Chunk {chunk_num} was blocked by Gemini. Reason: {response.prompt_feedback.block_reason}")
-                    return ""
-                else:
-                    print(f"Warning: Chunk {chunk_num} - No content generated by Gemini.")
-                    return ""
-
-            outline_output = ""
-            if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-                outline_output = "".join(part.text for part in response.candidates[0].content.parts if hasattr(part, 'text')).strip()
-
-            if not outline_output:
-                print(f"Warning: Chunk {chunk_num} - Gemini returned an empty outline.")
-                return ""
-
-            # Check content preservation, but always return outline_output
-            # This check will now often show lower preservation as corrections are allowed
-            if self._strict_content_preservation_check(outline_output, text_chunk):
-                print(f"Chunk {chunk_num} outline passed content preservation check (minimal changes).")
-            else:
-                print(f"WARNING: Chunk {chunk_num} outline FAILED strict content preservation check. Content was corrected/reformatted.")
-                print("The output will still be included as per user request to fix errors.")
-            
-            return outline_output # ALWAYS RETURN THE OUTPUT
-
+            outline_output, backend_name = self.router.generate(full_prompt, chunk_num)
+            if backend_name != 'gemini':
+                print(f"Chunk {chunk_num} formatted by {backend_name}.")
+            # Content preservation is checked (and failing chunks retried) by the caller
+            return outline_output, backend_name
+
+        except EmptyResponse as e:
+            print(f"Warning: Chunk {chunk_num} - {e}.")
+            emit(EVENT_WARNING, chunk=chunk_num, message=str(e))
+            return "", None
         except Exception as e:
-            print(f"Error with Gemini API for Chunk {chunk_num}/{total_chunks}: {e}")
+            print(f"Error with Gemini API for Chunk {chunk_position}: {e}")
+            emit(EVENT_ERROR, chunk=chunk_num, message=f"Gemini API error: {e}")
+            return "", None
+
+    def _missing_spans_note(self, missing_spans):
+        """Prompt addition for a retry: the passages the previous outline dropped."""
+        if not missing_spans:
             return ""
+        listed = "\n        ".join(f"- {' '.join(span.split())}" for span in missing_spans)
+        return f"""
+        A previous outline of this chunk left out the passages below. Include every one of them, in its original place:
+        {listed}
+        """
+
+    def _make_emitter(self, progress_callback):
+        """Wrap an optional per-request callback as emit(event_type, **fields)."""
+        def emit(event_type, **fields):
+            if progress_callback is not None:
+                progress_callback({'type': event_type, **fields})
+        return emit
+
+    def _gemini_outline(self, prompt, chunk_num):
+        """The Gemini backend for self.router: outline text, or EmptyResponse if Gemini blocked or returned nothing."""
+        response = self._generate_with_backoff(prompt, chunk_num)
+        if not response.candidates:
+            if hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
+                print(f"Warning: Chunk {chunk_num} was blocked by Gemini. Reason: {response.prompt_feedback.block_reason}")
+                raise EmptyResponse(f"Blocked by Gemini ({response.prompt_feedback.block_reason})")
+            raise EmptyResponse("No content generated by Gemini")
+
+        outline_output = ""
+        if response.candidates[0].content and response.candidates[0].content.parts:
+            outline_output = "".join(part.text for part in response.candidates[0].content.parts if hasattr(part, 'text')).strip()
+        if not outline_output:
+            raise EmptyResponse("Gemini returned an empty outline")
+        return outline_output
+
+    def _generate_with_backoff(self, prompt, chunk_num):
+        """Call Gemini, backing off exponentially (with jitter) when we hit rate limits."""
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+        user = getattr(self._call_context, 'user', None)
+        emit = getattr(self._call_context, 'emit', None)
+
+        def on_wait(seconds):
+            print(f"Chunk {chunk_num} waiting ~{seconds:.1f}s for Gemini quota...")
+            if emit is not None:
+                emit(EVENT_QUOTA_WAIT, chunk=chunk_num, seconds=seconds)
+
+        generation_config = genai.types.GenerationConfig(
+            temperature=0.2,  # Slightly higher to allow for minor corrections, but still low
+            top_p=0.8,        # Reduced to limit variation
+            max_output_tokens=MAX_OUTPUT_TOKENS
+        )
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            # With a context cache, only the part of the prompt after the cached instructions is sent
+            model, contents = self.prompt_cache.split(prompt) if self.prompt_cache is not None else (None, prompt)
+            # Every attempt, retries included, is paid for from the shared budget, counting only the tokens sent
+            self.rate_limiter.acquire(estimate_tokens(contents), user=user, on_wait=on_wait)
+            try:
+                with self._gemini_call_slots:
+                    try:
+                        return (model or self.model).generate_content(contents, generation_config=generation_config)
+                    except google_exceptions.NotFound:
+                        if model is None:
+                            raise
+                        # The cached instructions expired or were deleted on Gemini's side; the full prompt costs the difference
+                        self.prompt_cache.invalidate()
+                        self.rate_limiter.acquire(estimate_tokens(prompt) - estimate_tokens(contents), user=user, on_wait=on_wait)
+                        return self.model.generate_content(prompt, generation_config=generation_config)
+            except (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable) as e:
+                if attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise
+                delay = RATE_LIMIT_BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+                print(f"Chunk {chunk_num} rate limited ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def format_chunks(self, text_chunks, original_full_text, emit=None):
+        """Send all chunks to Gemini concurrently (capped at max_concurrent_chunks) and return outlines in chunk order."""
+        emit = emit or self._make_emitter(None)
+        return self.format_chunk_stream(((chunk, None, None) for chunk in text_chunks), emit, total_chunks=len(text_chunks))
+
+    def format_chunk_stream(self, chunks, emit=None, total_chunks=None, user_id=None):
+        """Format (chunk_text, page_num, blocks) as the iterator produces them and return outlines in chunk order.
+
+        With the 'local' or 'auto' engine, chunks whose blocks are known are outlined locally first
+        (see LocalOutliner). The iterator is only advanced while fewer than PIPELINE_CHUNKS_AHEAD
+        chunks per Gemini worker are waiting, so extraction can't run far ahead of formatting.
+        user_id identifies the requester to the rate limiter, which serves users waiting for quota in turn.
+        """
+        emit = emit or self._make_emitter(None)
+        outlines = [] # Outline strings, or futures for chunks still at Gemini
+        in_flight = set()
+        hits = 0
+        local_chunks = 0
+        retry_budget = {'left': PRESERVATION_RETRY_BUDGET}
+        retry_lock = threading.Lock()
+
+        def take_retry():
+            """Claim one re-prompt from this document's budget (shared by the chunk threads)."""
+            with retry_lock:
+                if retry_budget['left'] <= 0:
+                    return False
+                retry_budget['left'] -= 1
+                return True
+
+        def format_one(i, chunk_text, page_num, blocks, cache_key):
+            print(f"\nProcessing Chunk {i+1} with CORRECTION ENABLED")
+            self._call_context.user = user_id
+            self._call_context.emit = emit
+            outline, engine = self.outline_chunk(chunk_text, i + 1, total_chunks, emit)
+            report = self._content_preservation_report(outline, chunk_text)
+            if report is not None and report.coverage < PRESERVATION_THRESHOLD:
+                outline, report, engine = self._retry_failed_chunk(i + 1, total_chunks, chunk_text, blocks, outline, engine, report, take_retry, emit)
+            if report is not None:
+                self._emit_preservation(emit, i + 1, report)
+            # Raw-text fallbacks are not cached, so the next upload gives the models another go
+            if outline and cache_key and engine not in (None, 'raw'):
+                self.outline_cache.put(cache_key, outline, engine)
+            emit(EVENT_CHUNK_DONE, chunk=i + 1, total_chunks=total_chunks, chars=len(chunk_text), page=page_num, outline=outline, cached=False, engine=engine)
+            return outline
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_chunks, thread_name_prefix="gemini-chunk") as executor:
+            for i, (chunk_text, page_num, blocks) in enumerate(chunks):
+                # Serve repeat content from the on-disk cache; only misses go to Gemini
+                cache_key = None
+                if self.outline_cache is not None and self.engine != 'local':
+                    cache_key = OutlineCache.make_key(chunk_text, self.cache_version)
+                    cached = self.outline_cache.get(cache_key)
+                    if cached is not None:
+                        outline, backend_name = cached
+                        hits += 1
+                        outlines.append(outline)
+                        emit(EVENT_CHUNK_DONE, chunk=i + 1, total_chunks=total_chunks, chars=len(chunk_text), page=page_num, outline=outline, cached=True, engine=backend_name)
+                        continue
+
+                if blocks is not None and self.engine != 'gemini':
+                    confidence = self.local_outliner.confidence(blocks)
+                    if self.engine == 'local' or confidence >= LOCAL_OUTLINE_MIN_CONFIDENCE:
+                        outline = self.local_outliner.outline(blocks)
+                        report = self._content_preservation_report(outline, chunk_text)
+                        if report is not None:
+                            self._emit_preservation(emit, i + 1, report)
+                        local_chunks += 1
+                        outlines.append(outline)
+                        emit(EVENT_CHUNK_DONE, chunk=i + 1, total_chunks=total_chunks, chars=len(chunk_text), page=page_num, outline=outline, cached=False, engine='local')
+                        continue
+                    print(f"Chunk {i+1}: local outline confidence {confidence:.2f}, escalating to Gemini.")
+
+                while len(in_flight) >= self.max_concurrent_chunks * PIPELINE_CHUNKS_AHEAD:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                future = executor.submit(carry_context(format_one), i, chunk_text, page_num, blocks, cache_key)
+                in_flight.add(future)
+                outlines.append(future)
+
+            misses = len(outlines) - hits - local_chunks
+            if local_chunks:
+                print(f"Local outliner: {local_chunks} of {len(outlines)} chunks, {misses} sent to Gemini")
+            if self.outline_cache is not None and self.engine != 'local':
+                print(f"Outline cache: {hits} hits, {misses} misses ({len(outlines)} chunks)")
+                emit(EVENT_CACHE, hits=hits, misses=misses, total_chunks=len(outlines))
+            return [outline if isinstance(outline, str) else outline.result() for outline in outlines]
 
     def _strict_content_preservation_check(self, outline_text, original_chunk_text):
         """
@@ -1537,38 +2156,64 @@ class GeminiContentPreservingConverter:
         Verifies that substantial portions of original text appear in the outline.
         This check will now often show lower preservation as corrections are allowed.
         """
-        if not outline_text or not original_chunk_text:
-            return True
-
-        # Remove formatting markers to check actual content
-        cleaned_outline = re.sub(r'^\s*\d+\.\s*', '', outline_text, flags=re.MULTILINE)
-        cleaned_outline = re.sub(r'^\s*\d+\.[a-zA-Z]\.\s*', '', cleaned_outline, flags=re.MULTILINE)
-        cleaned_outline = re.sub(r'^\s*\|--\s*', '', cleaned_outline, flags=re.MULTILINE)
-        cleaned_outline = re.sub(r'^\s*\|\s*\|--\s*', '', cleaned_outline, flags=re.MULTILINE)
-        
-        # Extract sentences from both texts
-        original_sentences = [s.strip() for s in re.split(r'[.!?]+', original_chunk_text) if s.strip() and len(s.strip()) > 10]
-        outline_sentences = [s.strip() for s in re.split(r'[.!?]+', cleaned_outline) if s.strip() and len(s.strip()) > 10]
-        
-        if not original_sentences:
-            return True
-            
-        # Check how many original sentences appear (with minor variations allowed for punctuation)
-        preserved_count = 0
-        for orig_sentence in original_sentences:
-            orig_words = set(re.findall(r'\b\w+\b', orig_sentence.lower()))
-            for outline_sentence in outline_sentences:
-                outline_words = set(re.findall(r'\b\w+\b', outline_sentence.lower()))
-                # If 90% of original words are preserved, consider it preserved
-                if orig_words and len(orig_words.intersection(outline_words)) / len(orig_words) >= 0.9:
-                    preserved_count += 1
-                    break
-        
-        preservation_ratio = preserved_count / len(original_sentences) if original_sentences else 0
-        print(f"Content preservation check: {preservation_ratio:.2%} of original sentences preserved")
-        
         # This threshold is now more indicative than blocking, as corrections are allowed
-        return preservation_ratio >= 0.8 # Keep as 0.8 or lower if you want to be less strict on warnings
+        return self._content_preservation_ratio(outline_text, original_chunk_text) >= PRESERVATION_THRESHOLD
+
+    def _content_preservation_ratio(self, outline_text, original_chunk_text):
+        """Share of the original chunk's words that survive in the outline (see preservation.py)."""
+        report = self._content_preservation_report(outline_text, original_chunk_text)
+        return report.coverage if report else 1.0
+
+    def _content_preservation_report(self, outline_text, original_chunk_text):
+        """PreservationReport with coverage plus missing/inserted spans, or None if the chunk has no text.
+        An empty outline (no answer, or an error) covers none of it."""
+        if not original_chunk_text or not original_chunk_text.strip():
+            return None
+        with stage_span('preservation', words=len(original_chunk_text.split())):
+            report = check_preservation(original_chunk_text, outline_text or "")
+        print(f"Content preservation check: {report.coverage:.2%} of original text preserved "
+              f"({len(report.missing_spans)} missing, {len(report.inserted_spans)} inserted span(s))")
+        return report
+
+    def _emit_preservation(self, emit, chunk_num, report):
+        passed = report.coverage >= PRESERVATION_THRESHOLD
+        if passed:
+            print(f"Chunk {chunk_num} outline passed content preservation check (minimal changes).")
+        else:
+            print(f"WARNING: Chunk {chunk_num} outline FAILED strict content preservation check. Content was corrected/reformatted.")
+            print("The output will still be included as per user request to fix errors.")
+        emit(EVENT_PRESERVATION, chunk=chunk_num, ratio=report.coverage, passed=passed,
+             missing=report.missing_spans[:PRESERVATION_EVENT_SPANS], inserted=report.inserted_spans[:PRESERVATION_EVENT_SPANS])
+
+    def _retry_failed_chunk(self, chunk_num, total_chunks, chunk_text, blocks, outline, engine, report, take_retry, emit):
+        """Re-prompt a chunk whose outline failed the preservation check, naming what it left out.
+
+        Returns (outline, report, engine) for the best attempt, engine being the backend that wrote it. If every retry fails too, the chunk's
+        raw extracted text is used instead (engine 'raw'); if the document's retry budget is already
+        spent, the failing outline is kept as before, unless it is empty.
+        """
+        start_time = time.monotonic()
+        attempts = 0
+        while attempts < PRESERVATION_RETRIES_PER_CHUNK and report.coverage < PRESERVATION_THRESHOLD and take_retry():
+            attempts += 1
+            print(f"Chunk {chunk_num}: {report.coverage:.2%} preserved, retry {attempts} of {PRESERVATION_RETRIES_PER_CHUNK}...")
+            retry_outline, retry_engine = self.outline_chunk(chunk_text, chunk_num, total_chunks, emit, missing_spans=report.missing_spans)
+            retry_report = self._content_preservation_report(retry_outline, chunk_text)
+            if retry_report is not None and retry_report.coverage > report.coverage:
+                outline, engine, report = retry_outline, retry_engine, retry_report
+
+        if not attempts and outline:
+            emit(EVENT_WARNING, chunk=chunk_num, message="Preservation retry budget used up; kept the outline that failed the check")
+            return outline, report, engine
+
+        outcome = 'passed'
+        if report.coverage < PRESERVATION_THRESHOLD:
+            print(f"Chunk {chunk_num}: still failing after {attempts} retries, using the raw extracted text.")
+            outline = self.local_outliner.outline(blocks or [(chunk_text, 0)])
+            report = self._content_preservation_report(outline, chunk_text) or report
+            engine, outcome = 'raw', 'raw_text'
+        emit(EVENT_RETRY, chunk=chunk_num, attempts=attempts, seconds=time.monotonic() - start_time, ratio=report.coverage, outcome=outcome)
+        return outline, report, engine
 
     def parse_llm_outline(self, outline_text):
         """Parse the LLM's structured outline based on indentation."""
@@ -1635,9 +2280,8 @@ class GeminiContentPreservingConverter:
                 continue
         return parsed_structure
 
-    def _render_content_recursive_docx(self, document, content_list, current_base_indent_inch):
+    def _render_content_recursive_docx(self, writer, content_list, current_base_indent_inch):
         """Helper to recursively render content for DOCX, managing indentation and styling."""
-        
         for item in content_list:
             item_type = item.get('type')
             
@@ -1645,135 +2289,201 @@ class GeminiContentPreservingConverter:
                 marker = item.get('marker', '')
                 title = item.get('title', '')
                 
-                paragraph = document.add_paragraph()
-                paragraph.paragraph_format.left_indent = current_base_indent_inch + Inches(0.25)
-                paragraph.paragraph_format.space_before = Pt(6)
-                paragraph.paragraph_format.space_after = Pt(6)
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                # Apply 1.5 line spacing
-                paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
-                paragraph.paragraph_format.line_spacing = 1.5
-
-                marker_run = paragraph.add_run(f"{marker} ")
-                marker_run.font.name = HIERARCHY_MARKER_FONT_NAME
-                marker_run.font.size = Pt(HEADING_FONT_SIZE - 1)
-                marker_run.bold = True
-                
-                self._format_text_for_docx(paragraph, title, SUBTITLE_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR, is_bold=True)
+                marker_run = (f"{marker} ", HIERARCHY_MARKER_FONT_NAME, HEADING_FONT_SIZE - 1, None, True)
+                writer.add_paragraph(
+                    [marker_run] + self._highlighted_runs(title, SUBTITLE_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR, is_bold=True),
+                    left_indent=current_base_indent_inch + 0.25, space_before=6, space_after=6, line_spacing=1.5,
+                )
                 
                 self._render_content_recursive_docx(
-                    document,
+                    writer,
                     item.get('content', []),
-                    current_base_indent_inch + Inches(0.25)
+                    current_base_indent_inch + 0.25
                 )
             
             elif item_type == 'bullet':
                 text = item.get('text', '')
                 bullet_level = item.get('level', 1)
                 
-                paragraph = document.add_paragraph()
-                bullet_indent_inch = current_base_indent_inch + (bullet_level - 1) * Inches(0.25)
-                paragraph.paragraph_format.left_indent = bullet_indent_inch
-                paragraph.paragraph_format.space_before = Pt(3)
-                paragraph.paragraph_format.space_after = Pt(3)
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                # Apply 1.5 line spacing
-                paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
-                paragraph.paragraph_format.line_spacing = 1.5
-
-
-                bullet_run = paragraph.add_run(f"{BULLET_PREFIX}")
-                bullet_run.font.name = HIERARCHY_MARKER_FONT_NAME
-                bullet_run.font.size = Pt(BODY_FONT_SIZE)
-                bullet_run.bold = True
-
-                self._format_text_for_docx(paragraph, text, CONTENT_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR)
+                bullet_run = (BULLET_PREFIX, HIERARCHY_MARKER_FONT_NAME, BODY_FONT_SIZE, None, True)
+                writer.add_paragraph(
+                    [bullet_run] + self._highlighted_runs(text, CONTENT_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR),
+                    left_indent=current_base_indent_inch + (bullet_level - 1) * 0.25, space_before=3, space_after=3, line_spacing=1.5,
+                )
                 
     def create_docx_from_outline(self, parsed_structure_or_text, output_path):
-        """Create a DOCX from the parsed outline structure or raw text if parsing fails."""
-        document = Document()
-
-        document.styles['Normal'].font.name = 'Courier New'
-        document.styles['Normal'].font.size = Pt(BODY_FONT_SIZE)
-
-        main_section_base_indent_inch = Inches(0.25)
-        
-        # Check if it's a list (parsed structure) or a string (raw text)
-        if isinstance(parsed_structure_or_text, list) and parsed_structure_or_text:
-            for main_section in parsed_structure_or_text:
-                if main_section.get('type') == 'main_section':
-                    marker = main_section.get('marker', '')
-                    title = main_section.get('title', 'Untitled Section')
-
-                    paragraph = document.add_paragraph()
-                    paragraph.paragraph_format.left_indent = main_section_base_indent_inch
-                    paragraph.paragraph_format.space_before = Pt(12)
-                    paragraph.paragraph_format.space_after = Pt(8)
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    # Apply 1.5 line spacing
-                    paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
-                    paragraph.paragraph_format.line_spacing = 1.5
-
-
-                    marker_run = paragraph.add_run(f"{marker} ")
-                    marker_run.font.name = HIERARCHY_MARKER_FONT_NAME
-                    marker_run.font.size = Pt(HEADING_FONT_SIZE)
-                    marker_run.bold = True
-                    
-                    self._format_text_for_docx(paragraph, title, TITLE_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR, is_bold=True)
-
-                    self._render_content_recursive_docx(
-                        document,
-                        main_section.get('content', []),
-                        main_section_base_indent_inch
-                    )
-                document.add_paragraph().add_run().add_break()
-        else: # It's a string or empty list, indicating no structured content
-            paragraph = document.add_paragraph()
-            # Apply 1.5 line spacing to raw text fallback
-            paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
-            paragraph.paragraph_format.line_spacing = 1.5
-            if isinstance(parsed_structure_or_text, str) and parsed_structure_or_text.strip():
-                self._format_text_for_docx(paragraph, parsed_structure_or_text, CONTENT_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR)
-            else:
-                paragraph.add_run("No structured content could be generated or parsed. The document might be image-based, encrypted, or content processing led to an empty output.").font.size = Pt(BODY_FONT_SIZE)
+        """Create a DOCX from the parsed outline structure or raw text if parsing fails. Returns the paragraph count, or None if saving failed.
 
+        Paragraphs are streamed to disk as they are rendered (see docx_stream.py), so memory does not grow with the outline.
+        """
+        main_section_base_indent_inch = 0.25
+        # Highlighting happens paragraph by paragraph while writing; its time is reported as its own stage
+        highlight_clock = Stopwatch()
+        self._call_context.highlight_clock = highlight_clock
+        start_time = time.monotonic()
         try:
-            document.save(output_path)
+            with StreamingDocxWriter(output_path, font_name='Courier New', font_size=BODY_FONT_SIZE) as writer:
+                # Check if it's a list (parsed structure) or a string (raw text)
+                if isinstance(parsed_structure_or_text, list) and parsed_structure_or_text:
+                    for main_section in parsed_structure_or_text:
+                        if main_section.get('type') == 'main_section':
+                            marker = main_section.get('marker', '')
+                            title = main_section.get('title', 'Untitled Section')
+
+                            marker_run = (f"{marker} ", HIERARCHY_MARKER_FONT_NAME, HEADING_FONT_SIZE, None, True)
+                            writer.add_paragraph(
+                                [marker_run] + self._highlighted_runs(title, TITLE_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR, is_bold=True),
+                                left_indent=main_section_base_indent_inch, space_before=12, space_after=8, line_spacing=1.5,
+                            )
+
+                            self._render_content_recursive_docx(
+                                writer,
+                                main_section.get('content', []),
+                                main_section_base_indent_inch
+                            )
+                        writer.add_paragraph([("\n",)], align=None) # Blank line between sections
+                elif isinstance(parsed_structure_or_text, str) and parsed_structure_or_text.strip():
+                    writer.add_paragraph(self._highlighted_runs(parsed_structure_or_text, CONTENT_TEXT_FONT_NAME, DEFAULT_TEXT_COLOR), line_spacing=1.5, align=None)
+                else: # Empty list, indicating no structured content
+                    writer.add_paragraph(
+                        [("No structured content could be generated or parsed. The document might be image-based, encrypted, or content processing led to an empty output.", None, BODY_FONT_SIZE)],
+                        line_spacing=1.5, align=None,
+                    )
             print(f"DOCX created successfully: {output_path}")
+            return writer.paragraph_count
         except Exception as e:
             print(f"Error creating DOCX: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        finally:
+            self._call_context.highlight_clock = None
+            record_stage('highlighting', highlight_clock.seconds)
+            record_stage('docx_save', time.monotonic() - start_time - highlight_clock.seconds)
+
+    def process_file(self, input_path, output_path=None, progress_callback=None, user_id=None):
+        """Convert one PDF and return a ConversionResult; progress_callback receives this call's progress events (see EVENT_* above).
+
+        user_id: who asked for the conversion, so Gemini quota is shared fairly between users.
+        """
+        result = ConversionResult()
+        preservation_ratios = []
 
-    def process_file(self, input_path, output_path=None):
+        def record(event):
+            if event['type'] == EVENT_PRESERVATION:
+                preservation_ratios.append(event['ratio'])
+            if progress_callback is not None:
+                progress_callback(event)
+
+        emit = self._make_emitter(record)
+        start_time = time.monotonic()
+        try:
+            with stage_span('conversion', file=os.path.basename(input_path)):
+                self._process_file(input_path, output_path, emit, result, user_id)
+        except Exception:
+            CONVERSIONS.inc(outcome='error')
+            raise
+        result.timings['total'] = time.monotonic() - start_time
+        CONVERSIONS.inc(outcome='failed' if not result.output_path else 'empty' if result.empty_outline else 'ok')
+        if preservation_ratios:
+            result.preservation_score = sum(preservation_ratios) / len(preservation_ratios)
+        emit(EVENT_METRICS, elapsed_seconds=result.timings['total'], total_chunks=result.total_chunks, output_path=result.output_path,
+             backends=self.router.metrics())
+        return result
+
+    def _write_docx(self, content, output_path, result, empty_outline):
+        """Write the DOCX and record what was written on the result."""
+        paragraph_count = self.create_docx_from_outline(content, output_path)
+        if paragraph_count is not None:
+            result.output_path = output_path
+            result.paragraph_count = paragraph_count
+        result.empty_outline = empty_outline
+
+    def _process_file(self, input_path, output_path, emit, result, user_id=None):
         print(f"Processing PDF in CONTENT PRESERVATION + CORRECTION MODE: {input_path}")
         file_ext = os.path.splitext(input_path)[1].lower()
         if file_ext != '.pdf':
             print(f"Unsupported file type: {file_ext}.")
-            return None
+            emit(EVENT_ERROR, message=f"Unsupported file type: {file_ext}")
+            return
 
-        pdf_full_text = self.extract_text_from_pdf(input_path)
-        if not pdf_full_text:
+        emit(EVENT_STAGE, stage='extracting')
+        start_time = time.monotonic()
+        try:
+            page_count = self.count_pdf_pages(input_path)
+        except Exception as e:
+            print(f"Error opening PDF: {e}")
+            page_count = 0
+        extraction = {'pages': 0, 'chars': 0, 'error': None}
+
+        def chunks():
+            """Pages are read lazily and chunked as they arrive, so Gemini starts on the first chunk right away."""
+            print(f"Extracting text from PDF: {input_path}")
+            chunker = TokenBudgetChunker(page_groups=self.page_groups)
+            # Only time spent reading pages and cutting chunks counts; extraction also pauses while formatting catches up
+            extract_clock = Stopwatch()
+            chunk_clock = Stopwatch()
+            chunk_tokens = [] # Gemini's count for every chunk produced
+
+            def verified(new_chunks):
+                for chunk in new_chunks:
+                    for chunk_text, page_num, chunk_blocks, tokens in self.verified_chunks(*chunk):
+                        chunk_tokens.append(tokens)
+                        yield chunk_text, page_num, chunk_blocks
+            try:
+                for blocks in extract_clock.iterate(self.iter_pdf_pages(input_path, blocks=True)):
+                    page_text = "\n\n".join(text for text, _ in blocks)
+                    extraction['chars'] += len(page_text)
+                    extraction['pages'] += 1
+                    with chunk_clock:
+                        new_chunks = list(verified(chunker.feed(blocks, estimate_tokens(page_text))))
+                    yield from new_chunks
+            except Exception as e:
+                print(f"Error extracting text from PDF: {e}")
+                extraction['error'] = e
+                return
+            finally:
+                record_stage('extraction', extract_clock.seconds, pages=extraction['pages'])
+            result.timings['extraction'] = time.monotonic() - start_time
+            emit(EVENT_EXTRACTED, pages=extraction['pages'], chars=extraction['chars'])
+            with chunk_clock:
+                last_chunks = list(verified(chunker.finish()))
+            yield from last_chunks
+            record_stage('chunking', chunk_clock.seconds, chunks=len(chunk_tokens))
+            if chunk_tokens:
+                result.chunk_fill_ratio = sum(chunk_tokens) / len(chunk_tokens) / chunker.token_budget
+                print(f"Chunking: {len(chunk_tokens)} chunks of up to {chunker.token_budget} tokens, {result.chunk_fill_ratio:.0%} full on average, "
+                      f"{chunker.regrouped_chunks} laid out as in an earlier conversion")
+                emit(EVENT_CHUNKED, total_chunks=len(chunk_tokens), tokens=sum(chunk_tokens), fill_ratio=result.chunk_fill_ratio)
+
+        chunk_outlines = []
+        if page_count:
+            emit(EVENT_STAGE, stage='formatting', total_pages=page_count)
+            chunk_outlines = self.format_chunk_stream(chunks(), emit, user_id=user_id)
+        result.timings['formatting'] = time.monotonic() - start_time
+        result.total_chunks = len(chunk_outlines)
+
+        if not page_count or extraction['error'] or not extraction['chars']:
             print("Failed to extract text from PDF.")
+            emit(EVENT_ERROR, message="Failed to extract text from the PDF. The document might be image-based, encrypted, or corrupted.")
             if not output_path:
                 base_name = os.path.splitext(os.path.basename(input_path))[0]
                 output_path = f"{base_name}_gemini_extraction_failed.docx"
-            self.create_docx_from_outline("Failed to extract text from the PDF. The document might be image-based, encrypted, or corrupted.", output_path)
-            return output_path
+            self._write_docx("Failed to extract text from the PDF. The document might be image-based, encrypted, or corrupted.", output_path, result, empty_outline=True)
+            return
 
-        text_chunks = self.split_text_into_chunks(pdf_full_text)
-        if not text_chunks:
+        if not chunk_outlines:
             print("PDF text resulted in no processable chunks.")
+            emit(EVENT_ERROR, message="PDF content was extracted but resulted in no processable text chunks.")
             if not output_path:
                 base_name = os.path.splitext(os.path.basename(input_path))[0]
                 output_path = f"{base_name}_gemini_no_chunks.docx"
-            self.create_docx_from_outline("PDF content was extracted but resulted in no processable text chunks.", output_path)
-            return output_path
-            
-        print(f"PDF text split into {len(text_chunks)} chunks.")
+            self._write_docx("PDF content was extracted but resulted in no processable text chunks.", output_path, result, empty_outline=True)
+            return
+
+        print(f"PDF text split into {len(chunk_outlines)} chunks.")
         all_outlines = []
-        for i, chunk_text in enumerate(text_chunks):
-            print(f"\nProcessing Chunk {i+1} of {len(text_chunks)} with CORRECTION ENABLED")
-            chunk_outline = self.process_with_gemini(chunk_text, i + 1, len(text_chunks), pdf_full_text)
+        for i, chunk_outline in enumerate(chunk_outlines):
             if chunk_outline:
                 all_outlines.append(chunk_outline)
             else:
@@ -1781,11 +2491,12 @@ class GeminiContentPreservingConverter:
         
         if not all_outlines:
             print("No outlines were generated by Gemini for any chunks.")
+            emit(EVENT_ERROR, message="No outlines could be generated by Gemini for the provided content.")
             if not output_path:
                 base_name = os.path.splitext(os.path.basename(input_path))[0]
                 output_path = f"{base_name}_gemini_empty_output.docx"
-            self.create_docx_from_outline("No outlines could be generated by Gemini for the provided content.", output_path)
-            return output_path
+            self._write_docx("No outlines could be generated by Gemini for the provided content.", output_path, result, empty_outline=True)
+            return
 
         combined_outline_text = "\n".join(all_outlines)
 
@@ -1793,6 +2504,8 @@ class GeminiContentPreservingConverter:
         print(combined_outline_text[:1000] + "..." if len(combined_outline_text) > 1000 else combined_outline_text)
         print("--- End of Combined Outline ---")
 
+        emit(EVENT_STAGE, stage='writing')
+        stage_start = time.monotonic()
         parsed_structure = self.parse_llm_outline(combined_outline_text)
         
         if not output_path:
@@ -1801,13 +2514,13 @@ class GeminiContentPreservingConverter:
 
         if not parsed_structure and combined_outline_text:
             print("Failed to parse the combined outline into a structured format. DOCX will contain raw corrected content.")
-            self.create_docx_from_outline(combined_outline_text, output_path)
+            emit(EVENT_WARNING, message="Outline could not be parsed into sections; the DOCX contains the raw corrected text.")
+            self._write_docx(combined_outline_text, output_path, result, empty_outline=False)
         elif parsed_structure:
-            self.create_docx_from_outline(parsed_structure, output_path)
+            self._write_docx(parsed_structure, output_path, result, empty_outline=False)
         else:
-            self.create_docx_from_outline("Content processing resulted in an empty or unparseable output.", output_path)
-        
-        return output_path
+            self._write_docx("Content processing resulted in an empty or unparseable output.", output_path, result, empty_outline=True)
+        result.timings['writing'] = time.monotonic() - stage_start
 
 def main():
     print("Gemini Outline Converter: Content Preservation with Minor Corrections")
@@ -1856,9 +2569,9 @@ def main():
     print("This may take several minutes depending on document size...")
     
     try:
-        result_path = converter.process_file(input_file, output_file)
-        if result_path:
-            print(f"\n✅ SUCCESS: Corrected and formatted outline created at: {result_path}")
+        result = converter.process_file(input_file, output_file)
+        if result.output_path:
+            print(f"\n✅ SUCCESS: Corrected and formatted outline created at: {result.output_path}")
             print("📋 Remember: Minor corrections were applied for readability. The core meaning and logical flow should be preserved.")
             print("⚠️ If 'Content preservation check FAILED' warnings appeared, it means corrections were made as intended.")
         else:
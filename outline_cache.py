@@ -0,0 +1,222 @@
+# On-disk, content-addressed cache of Gemini outline results.
+# Keys are a hash of the normalized chunk text plus the prompt/model version, so the same
+# syllabus uploaded again (by anyone) is served from SQLite instead of a Gemini round trip.
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.getenv("PRETTYNOTES_CACHE_DIR", ".prettynotes_cache")
+OUTLINE_CACHE_MAX_BYTES = int(os.getenv("PRETTYNOTES_OUTLINE_CACHE_MB", "256")) * 1024 * 1024
+TOKEN_COUNT_CACHE_MAX_ENTRIES = 200000 # A row is ~100 bytes
+OCR_CACHE_MAX_ENTRIES = 20000 # A row is one page of OCR'd text
+PAGE_GROUP_MAX_ENTRIES = 100000 # A row is the page hashes of one chunk
+
+
+def normalize_chunk_text(text):
+    """Collapse whitespace so re-extractions of the same PDF hash identically."""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def default_cache_path():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, "outlines.sqlite3")
+
+
+class _SqliteTable:
+    """One table in the shared cache database: the connection, WAL mode, schema and LRU trimming every cache here needs.
+
+    Subclasses name their TABLE and its COLUMNS (which include last_used), plus any extra SCHEMA statements.
+    """
+    TABLE = None
+    COLUMNS = None
+    SCHEMA = ()
+    TRIM_EVERY = 1000 # Puts between LRU trims
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({self.COLUMNS})")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_last_used ON {self.TABLE} (last_used)")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def _trim(self):
+        """After a put (holding the lock): every TRIM_EVERY puts, drop the least recently used rows beyond max_entries."""
+        self._puts += 1
+        if self._puts % self.TRIM_EVERY:
+            return
+        self._conn.execute(
+            f"DELETE FROM {self.TABLE} WHERE rowid IN ("
+            f" SELECT rowid FROM {self.TABLE} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class OutlineCache(_SqliteTable):
+    """SQLite-backed LRU cache, safe to share between threads and processes."""
+    TABLE = "outlines"
+    COLUMNS = "key TEXT PRIMARY KEY, outline TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL, backend TEXT NOT NULL DEFAULT 'gemini'"
+    # Triggers keep the outlines' total size in one row, so a put doesn't sum the whole table (other processes' writes included)
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS outline_bytes (total INTEGER NOT NULL)",
+        "INSERT INTO outline_bytes (total) SELECT (SELECT COALESCE(SUM(size), 0) FROM outlines)"
+        " WHERE NOT EXISTS (SELECT 1 FROM outline_bytes)",
+        "CREATE TRIGGER IF NOT EXISTS outlines_size_insert AFTER INSERT ON outlines"
+        " BEGIN UPDATE outline_bytes SET total = total + NEW.size; END",
+        "CREATE TRIGGER IF NOT EXISTS outlines_size_update AFTER UPDATE OF size ON outlines"
+        " BEGIN UPDATE outline_bytes SET total = total + NEW.size - OLD.size; END",
+        "CREATE TRIGGER IF NOT EXISTS outlines_size_delete AFTER DELETE ON outlines"
+        " BEGIN UPDATE outline_bytes SET total = total - OLD.size; END",
+    )
+
+    def __init__(self, path=None, max_bytes=OUTLINE_CACHE_MAX_BYTES):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        with self._lock, self._conn:
+            # Tables from before outlines recorded their backend
+            if "backend" not in {row[1] for row in self._conn.execute("PRAGMA table_info(outlines)")}:
+                try:
+                    self._conn.execute("ALTER TABLE outlines ADD COLUMN backend TEXT NOT NULL DEFAULT 'gemini'")
+                except sqlite3.OperationalError: # Another process added it first
+                    pass
+
+    @staticmethod
+    def make_key(chunk_text, version):
+        """Hash of the normalized chunk text plus the prompt/model version string."""
+        payload = f"{version}\0{normalize_chunk_text(chunk_text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached (outline, backend that wrote it), refreshing its LRU position, or None."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT outline, backend FROM outlines WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE outlines SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0], row[1]
+
+    def put(self, key, outline, backend='gemini'):
+        """Store an outline (written by the named model backend) and evict least-recently-used entries beyond max_bytes."""
+        size = len(outline.encode("utf-8"))
+        with self._lock, self._conn:
+            # An upsert (not INSERT OR REPLACE, whose implicit delete skips triggers) keeps outline_bytes exact
+            self._conn.execute(
+                "INSERT INTO outlines (key, outline, size, last_used, backend) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET outline = excluded.outline, size = excluded.size,"
+                " last_used = excluded.last_used, backend = excluded.backend",
+                (key, outline, size, time.time(), backend),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT total FROM outline_bytes").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM outlines ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM outlines WHERE key = ?", stale_keys)
+
+
+class TokenCountCache(_SqliteTable):
+    """Gemini token counts per chunk text, kept next to the outlines so re-uploads skip the count_tokens calls."""
+    TABLE = "token_counts"
+    COLUMNS = "key TEXT PRIMARY KEY, tokens INTEGER NOT NULL, last_used REAL NOT NULL"
+
+    def __init__(self, path=None, max_entries=TOKEN_COUNT_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    @staticmethod
+    def make_key(text, model_name):
+        """Token counts depend on the exact text (no normalization) and the model's tokenizer."""
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT tokens FROM token_counts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE token_counts SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, tokens):
+        """Store a count; every so often drop the least recently used ones beyond max_entries."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO token_counts (key, tokens, last_used) VALUES (?, ?, ?)",
+                (key, tokens, time.time()),
+            )
+            self._trim()
+
+
+class OcrCache(_SqliteTable):
+    """OCR results per page image, so a re-uploaded scan is not OCR'd again. Opened by each OCR worker process."""
+    TABLE = "ocr_pages"
+    COLUMNS = "key TEXT PRIMARY KEY, blocks TEXT NOT NULL, last_used REAL NOT NULL"
+    TRIM_EVERY = 100
+
+    def __init__(self, path=None, max_entries=OCR_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    @staticmethod
+    def make_key(image_bytes, settings):
+        """Hash of the rendered page pixels plus whatever else shapes the OCR output (language, image size)."""
+        digest = hashlib.sha256(f"{settings}\0".encode("utf-8"))
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached [(text, heading_level), ...] blocks for a page image, or None."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT blocks FROM ocr_pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE ocr_pages SET last_used = ? WHERE key = ?", (time.time(), key))
+            return [tuple(block) for block in json.loads(row[0])]
+
+    def put(self, key, blocks):
+        """Store a page's blocks; every so often drop the least recently used pages beyond max_entries."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages (key, blocks, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(blocks), time.time()),
+            )
+            self._trim()
+
+
+class PageGroupIndex(_SqliteTable):
+    """Which pages (by content hash) earlier conversions put together in one chunk, indexed by the first page."""
+    TABLE = "page_groups"
+    COLUMNS = "first_page TEXT NOT NULL, pages TEXT NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (first_page, pages)"
+
+    def __init__(self, path=None, max_entries=PAGE_GROUP_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    def get(self, first_page_hash):
+        """Known groups (lists of page hashes) starting with this page, longest first."""
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT pages FROM page_groups WHERE first_page = ?", (first_page_hash,)).fetchall()
+            if rows:
+                self._conn.execute("UPDATE page_groups SET last_used = ? WHERE first_page = ?", (time.time(), first_page_hash))
+        return sorted((json.loads(row[0]) for row in rows), key=len, reverse=True)
+
+    def put(self, page_hashes):
+        """Record one chunk's pages; every so often drop the least recently used groups beyond max_entries."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_groups (first_page, pages, last_used) VALUES (?, ?, ?)",
+                (page_hashes[0], json.dumps(page_hashes), time.time()),
+            )
+            self._trim()
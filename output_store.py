@@ -0,0 +1,125 @@
+# Persistent store of finished DOCX outputs, keyed by a hash of the uploaded PDF.
+# Replaces the old wipe-on-boot cleanup: entries expire after a TTL and the
+# least recently used ones are dropped once the store holds too many.
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+OUTPUT_TTL_SECONDS = float(os.getenv("PRETTYNOTES_OUTPUT_TTL_HOURS", "168")) * 3600
+OUTPUT_MAX_ENTRIES = int(os.getenv("PRETTYNOTES_OUTPUT_MAX_ENTRIES", "500"))
+COMPLETE_MARKER = ".complete"
+INCOMPLETE_GRACE_SECONDS = 3600 # Unfinished entries younger than this may still be converting
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """sha256 of a file, read in blocks so large PDFs are not loaded into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class OutputStore:
+    def __init__(self, root, ttl_seconds=OUTPUT_TTL_SECONDS, max_entries=OUTPUT_MAX_ENTRIES):
+        """Each entry is a directory <root>/<key>/ holding one DOCX plus a completion marker."""
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(pdf_path, version):
+        """Key on the PDF bytes and the converter version that produced the output."""
+        version_hash = hashlib.sha256(version.encode("utf-8")).hexdigest()[:12]
+        return f"{hash_file(pdf_path)}-{version_hash}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _is_expired(self, entry_dir):
+        marker = os.path.join(entry_dir, COMPLETE_MARKER)
+        return time.time() - os.path.getmtime(marker) > self.ttl_seconds
+
+    def output_path(self, key, file_name):
+        """A private path for one conversion of this key to write its DOCX to; publish() moves it into place.
+
+        Concurrent uploads of the same PDF each get their own, so none can read another's half-written file.
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        return os.path.join(tempfile.mkdtemp(prefix=".converting-", dir=entry_dir), file_name)
+
+    def publish(self, key, path):
+        """Atomically move a finished DOCX from output_path() into the entry and mark it complete; returns its final path.
+
+        Only completed entries are ever served from the store.
+        """
+        entry_dir = self._entry_dir(key)
+        final_path = os.path.join(entry_dir, os.path.basename(path))
+        os.replace(path, final_path)
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        with open(os.path.join(entry_dir, COMPLETE_MARKER), "w"):
+            pass
+        return final_path
+
+    def discard(self, path):
+        """Remove an output_path() that won't be published (failed conversion)."""
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    def detach(self, path):
+        """Move a DOCX written to output_path() out of the store, for one that is handed to the user but not
+        worth serving again (e.g. an empty outline); returns its new path in the system temp directory."""
+        detached_path = os.path.join(tempfile.mkdtemp(prefix="prettynotes-"), os.path.basename(path))
+        shutil.move(path, detached_path)
+        self.discard(path)
+        return detached_path
+
+    def get(self, key, file_name):
+        """Return the stored DOCX for this key (named file_name), or None on a miss."""
+        entry_dir = self._entry_dir(key)
+        if not os.path.exists(os.path.join(entry_dir, COMPLETE_MARKER)):
+            return None
+        if self._is_expired(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        stored = [name for name in os.listdir(entry_dir) if name.endswith(".docx")]
+        if not stored:
+            return None
+        path = os.path.join(entry_dir, file_name)
+        if not os.path.exists(path):
+            # Same PDF uploaded under a different name: hand back a copy with the expected name,
+            # copied aside and renamed so a concurrent request never sees it half-written
+            fd, tmp_path = tempfile.mkstemp(prefix=".copying-", dir=entry_dir)
+            os.close(fd)
+            shutil.copyfile(os.path.join(entry_dir, stored[0]), tmp_path)
+            os.replace(tmp_path, path)
+        os.utime(entry_dir)  # Directory mtime doubles as the LRU timestamp
+        return path
+
+    def prune(self):
+        """Delete expired or abandoned entries, then the least recently used ones beyond max_entries."""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            entry_dir = self._entry_dir(name)
+            if not os.path.isdir(entry_dir):
+                # Loose DOCX files left by versions that wrote straight into the output folder
+                if name.endswith(".docx"):
+                    os.remove(entry_dir)
+                continue
+            if not os.path.exists(os.path.join(entry_dir, COMPLETE_MARKER)):
+                if now - os.path.getmtime(entry_dir) > INCOMPLETE_GRACE_SECONDS:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            if self._is_expired(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(entry_dir), entry_dir))
+
+        entries.sort()
+        for _, entry_dir in entries[:max(0, len(entries) - self.max_entries)]:
+            shutil.rmtree(entry_dir, ignore_errors=True)
@@ -0,0 +1,112 @@
+# Content preservation check: how much of a chunk's original text survives in its outline.
+# Both texts are reduced to lowercase word tokens and compared through rolling hashes of
+# SHINGLE_WORDS-word windows, so the check is linear in the text length (whole books take
+# seconds) instead of comparing every original sentence with every outline sentence.
+import re
+
+SHINGLE_WORDS = 4 # Window size: a corrected word only un-covers itself, not its neighbours
+MAX_REPORTED_SPANS = 20
+_HASH_MOD = (1 << 61) - 1
+_HASH_BASE = 1000003
+
+# Hierarchy markers the outline adds: "1. ", "1.a. ", "|-- ", "| |-- "
+OUTLINE_MARKER = re.compile(r'^[ \t]*(?:\d+\.(?:[a-zA-Z]\.)?[ \t]+|(?:\|[ \t]*)*\|--[ \t]*)', re.MULTILINE)
+WORD = re.compile(r'\w+')
+
+
+class PreservationReport:
+    def __init__(self, coverage, missing_spans, inserted_spans):
+        self.coverage = coverage # Share (0-1) of the original's words found in the outline
+        self.missing_spans = missing_spans # Original text with no counterpart in the outline (first MAX_REPORTED_SPANS)
+        self.inserted_spans = inserted_spans # Outline text with no counterpart in the original (first MAX_REPORTED_SPANS)
+
+
+def _words(text):
+    return [word.lower() for word in WORD.findall(text)]
+
+
+def _window_hashes(ids, k):
+    """Polynomial rolling hash of every k-word window, in one pass."""
+    if len(ids) < k:
+        return []
+    top = pow(_HASH_BASE, k - 1, _HASH_MOD)
+    h = 0
+    for word_id in ids[:k]:
+        h = (h * _HASH_BASE + word_id) % _HASH_MOD
+    hashes = [h]
+    for i in range(k, len(ids)):
+        h = ((h - ids[i - k] * top) * _HASH_BASE + ids[i]) % _HASH_MOD
+        hashes.append(h)
+    return hashes
+
+
+def _covered(ids, other_ids, k):
+    """For each word of ids: is it inside some k-word window that also occurs in other_ids?"""
+    first_window = {}
+    for start, h in enumerate(_window_hashes(other_ids, k)):
+        first_window.setdefault(h, start)
+    covered = [False] * len(ids)
+    reach = 0 # Words before this index are covered by a matching window
+    for start, h in enumerate(_window_hashes(ids, k)):
+        other_start = first_window.get(h)
+        # Confirm the words too, so a hash collision can never count as a match
+        if other_start is not None and ids[start:start + k] == other_ids[other_start:other_start + k]:
+            reach = start + k
+        covered[start] = start < reach
+    for i in range(max(0, len(ids) - k + 1), len(ids)):
+        covered[i] = i < reach
+    return covered
+
+
+def _uncovered_spans(text, covered):
+    """Text of each maximal run of uncovered words (at most MAX_REPORTED_SPANS).
+
+    Word offsets are only looked up for the reported runs, so clean outlines cost nothing here.
+    """
+    runs = []
+    run_start = None
+    for i, is_covered in enumerate(covered):
+        if not is_covered and run_start is None:
+            run_start = i
+        elif is_covered and run_start is not None:
+            runs.append((run_start, i - 1))
+            run_start = None
+            if len(runs) == MAX_REPORTED_SPANS:
+                break
+    if run_start is not None and len(runs) < MAX_REPORTED_SPANS:
+        runs.append((run_start, len(covered) - 1))
+    if not runs:
+        return []
+
+    wanted = {i for run in runs for i in run}
+    offsets = {}
+    for i, match in enumerate(WORD.finditer(text)):
+        if i in wanted:
+            offsets[i] = match.span()
+            if len(offsets) == len(wanted):
+                break
+    return [text[offsets[first][0]:offsets[last][1]] for first, last in runs]
+
+
+def check_preservation(original_text, outline_text, k=SHINGLE_WORDS):
+    """Compare an outline against the text it was made from; returns a PreservationReport."""
+    outline_text = OUTLINE_MARKER.sub('', outline_text)
+    original_words = _words(original_text)
+    outline_words = _words(outline_text)
+    if not original_words:
+        return PreservationReport(1.0, [], _uncovered_spans(outline_text, [False] * len(outline_words)))
+
+    # Small integer ids keep the rolling hashes cheap
+    vocabulary = {word: i for i, word in enumerate(set(original_words) | set(outline_words), 1)}
+    original_ids = list(map(vocabulary.__getitem__, original_words))
+    outline_ids = list(map(vocabulary.__getitem__, outline_words))
+
+    # Very short texts are compared word by word rather than not at all
+    k = max(1, min(k, len(original_ids), len(outline_ids) or 1))
+    original_covered = _covered(original_ids, outline_ids, k)
+    outline_covered = _covered(outline_ids, original_ids, k)
+    return PreservationReport(
+        sum(original_covered) / len(original_ids),
+        _uncovered_spans(original_text, original_covered),
+        _uncovered_spans(outline_text, outline_covered),
+    )
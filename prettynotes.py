@@ -0,0 +1,188 @@
+# Headless command line entry point.
+#
+#   python prettynotes.py batch <dir> --workers 4
+#
+# Converts every PDF under <dir> using a pool of worker processes, writing DOCX files plus
+# a JSONL report. Progress is recorded in a manifest, so an interrupted run picks up where it stopped.
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+MANIFEST_NAME = "manifest.jsonl"
+REPORT_NAME = "report.jsonl"
+
+
+def find_pdfs(input_dir, recursive):
+    """PDF paths under input_dir, sorted so runs are reproducible."""
+    pdfs = []
+    for root, dirs, files in os.walk(input_dir):
+        pdfs.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        if not recursive:
+            break
+    return sorted(pdfs)
+
+
+def load_manifest(path):
+    """Map of relative PDF path -> sha256 for files already converted successfully."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial line from an interrupted run
+            if entry.get("status") == "ok":
+                done[entry["pdf"]] = entry["sha256"]
+    return done
+
+
+def append_jsonl(path, entry):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+
+
+def init_worker(engine):
+    """Batch workers already run one PDF per process, so each extracts and OCRs with a single process."""
+    from converter_pool import configure_pool
+    configure_pool(extraction_workers=1, ocr_workers=1, engine=engine)
+
+
+def convert_one(pdf_path, output_path, api_key):
+    """Runs in a worker process: convert one PDF and return its report entry."""
+    # Imported here so each worker builds (and then reuses) its own converter from the pool
+    from converter_pool import get_converter
+    from new_v4 import EVENT_PRESERVATION, EVENT_RETRY, EVENT_CACHE, EVENT_CHUNK_DONE, EVENT_ERROR
+
+    events = []
+    start_time = time.monotonic()
+    result, error = None, None
+    try:
+        converter = get_converter(api_key)
+        result = converter.process_file(pdf_path, output_path, progress_callback=events.append)
+    except Exception as e:
+        error = str(e)
+    elapsed = time.monotonic() - start_time
+
+    ratios = [e['ratio'] for e in events if e['type'] == EVENT_PRESERVATION]
+    cache = next((e for e in events if e['type'] == EVENT_CACHE), {})
+    # Chunk errors are reported, but a chunk recovered by a retry or the raw-text fallback still made it into the DOCX
+    errors = [e['message'] for e in events if e['type'] == EVENT_ERROR]
+    if error:
+        errors.append(error)
+    ok = error is None and result is not None and result.output_path and not result.empty_outline
+    return {
+        'status': "ok" if ok else "failed",
+        'output': result.output_path if result else None,
+        'seconds': round(elapsed, 3),
+        'paragraphs': result.paragraph_count if result else 0,
+        'chunks': result.total_chunks if result else 0,
+        'chunk_fill_ratio': round(result.chunk_fill_ratio, 4) if result and result.chunk_fill_ratio is not None else None,
+        'chunks_checked': len(ratios),
+        'preservation_mean': round(result.preservation_score, 4) if result and result.preservation_score is not None else None,
+        'preservation_min': round(min(ratios), 4) if ratios else None,
+        'chunks_failed_preservation': sum(1 for e in events if e['type'] == EVENT_PRESERVATION and not e['passed']),
+        'chunks_retried': [{key: round(e[key], 3) if key == 'seconds' else e[key] for key in ('chunk', 'attempts', 'seconds', 'outcome')}
+                           for e in events if e['type'] == EVENT_RETRY],
+        'cache_hits': cache.get('hits', 0),
+        'local_chunks': sum(1 for e in events if e['type'] == EVENT_CHUNK_DONE and e.get('engine') == 'local'),
+        'chunks_by_engine': dict(Counter(e.get('engine') for e in events if e['type'] == EVENT_CHUNK_DONE)),
+        'stage_seconds': {stage: round(t, 3) for stage, t in result.timings.items()} if result else {},
+        'errors': errors,
+    }
+
+
+def run_batch(args):
+    from model_backends import load_backends
+    from output_store import hash_file
+
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    # Same condition the converter checks: other model backends can stand in for Gemini
+    if not api_key and args.engine != "local" and not load_backends():
+        print("Gemini API key not found in environment variables (and no other model backend is configured).")
+        return 1
+
+    input_dir = os.path.abspath(args.input_dir)
+    output_dir = os.path.abspath(args.output_dir or os.path.join(input_dir, "prettynotes_output"))
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    report_path = os.path.join(output_dir, REPORT_NAME)
+
+    done = {} if args.restart else load_manifest(manifest_path)
+    jobs = []
+    skipped = 0
+    for pdf_path in find_pdfs(input_dir, args.recursive):
+        rel_path = os.path.relpath(pdf_path, input_dir)
+        sha256 = hash_file(pdf_path)
+        output_path = os.path.join(output_dir, os.path.splitext(rel_path)[0] + "_styled_outline.docx")
+        if done.get(rel_path) == sha256 and os.path.exists(output_path):
+            skipped += 1
+            continue
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        jobs.append((rel_path, sha256, pdf_path, output_path))
+
+    print(f"{len(jobs)} PDF(s) to convert with {args.workers} worker(s) ({skipped} already done per manifest).")
+    if not jobs:
+        return 0
+
+    failures = 0
+    batch_start = time.monotonic()
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.engine,))
+    try:
+        futures = {
+            executor.submit(convert_one, pdf_path, output_path, api_key): (rel_path, sha256)
+            for rel_path, sha256, pdf_path, output_path in jobs
+        }
+        for n, future in enumerate(as_completed(futures), 1):
+            rel_path, sha256 = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:  # Worker process died
+                entry = {'status': "failed", 'errors': [str(e)]}
+            entry = {'pdf': rel_path, 'sha256': sha256, **entry}
+            append_jsonl(report_path, entry)
+            append_jsonl(manifest_path, {'pdf': rel_path, 'sha256': sha256, 'status': entry['status']})
+            failures += entry['status'] != "ok"
+            print(f"[{n}/{len(jobs)}] {entry['status'].upper():6} {rel_path} ({entry.get('seconds', 0):.1f}s)")
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished files are recorded in the manifest. Re-run the same command to resume.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    executor.shutdown()
+
+    print(f"\nDone in {time.monotonic() - batch_start:.1f}s: {len(jobs) - failures} converted, {failures} failed.")
+    print(f"Report: {report_path}")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    # Before new_v4 (and the modules it imports) read their settings, so .env applies here and in forked workers alike
+    load_dotenv()
+    from new_v4 import OUTLINE_ENGINES, OUTLINE_ENGINE
+    parser = argparse.ArgumentParser(prog="prettynotes", description="PrettyNotes command line tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    batch = subcommands.add_parser("batch", help="Convert a directory of PDFs in parallel")
+    batch.add_argument("input_dir", help="Directory containing PDFs")
+    batch.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    batch.add_argument("--output-dir", help="Where DOCX files, the manifest and report go (default: <input_dir>/prettynotes_output)")
+    batch.add_argument("--recursive", action="store_true", help="Also convert PDFs in subdirectories")
+    batch.add_argument("--restart", action="store_true", help="Ignore the manifest and convert everything again")
+    batch.add_argument("--engine", choices=OUTLINE_ENGINES, default=OUTLINE_ENGINE,
+                       help="gemini: LLM for every chunk; local: PDF structure only, no API calls; auto: local, escalating unclear chunks to Gemini")
+    batch.set_defaults(handler=run_batch)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# Gemini context caching for the formatting instructions every chunk prompt starts with.
+# The instructions are uploaded once per process as a cached-content handle. Each call then sends
+# only the chunk and references the handle, so the same long prefix isn't sent (and billed) as
+# fresh input with every chunk. A handle in use is extended shortly before its TTL runs out; an
+# idle one simply expires on Gemini's side.
+#
+# Gemini only caches content of at least a model-dependent minimum size, and only for explicitly
+# versioned models (not -latest aliases). The converter checks both (context_cache_unusable) before
+# creating a handle, so a prefix that can't be cached costs nothing.
+import datetime
+import hashlib
+import os
+import threading
+import time
+
+CONTEXT_CACHE_ENABLED = os.getenv("PRETTYNOTES_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("PRETTYNOTES_CONTEXT_CACHE_MIN_TOKENS", "32768")) # Gemini's smallest cacheable content (1.5 models)
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("PRETTYNOTES_CONTEXT_CACHE_TTL", "3600"))
+CONTEXT_CACHE_REFRESH_SECONDS = 300 # Extend a handle this long before it would expire
+CONTEXT_CACHE_RETRY_SECONDS = 600 # After Gemini refuses to create a cache, send full prompts for this long before asking again
+
+
+class _Handle:
+    """One cached-content handle, shared by every converter in the process using the same model and prefix."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cached_content = None
+        self.model = None # GenerativeModel bound to cached_content
+        self.expires = 0.0 # Monotonic time
+        self.retry_after = 0.0
+
+
+_HANDLES = {} # (model_name, prefix sha256) -> _Handle
+_HANDLES_LOCK = threading.Lock()
+
+
+def context_cache_unusable(model_name, prefix_tokens):
+    """Why Gemini would refuse to cache a prefix_tokens-long prefix for model_name, or None if it wouldn't."""
+    if model_name.endswith("-latest"):
+        return f"{model_name} is an alias; context caching needs an explicitly versioned model (e.g. gemini-1.5-flash-002)"
+    if prefix_tokens < CONTEXT_CACHE_MIN_TOKENS:
+        return f"the instructions are ~{prefix_tokens} tokens, below the {CONTEXT_CACHE_MIN_TOKENS}-token minimum Gemini caches"
+    return None
+
+
+class GeminiPromptCache:
+    def __init__(self, model_name, prefix, ttl_seconds=CONTEXT_CACHE_TTL_SECONDS, refresh_seconds=CONTEXT_CACHE_REFRESH_SECONDS):
+        """Serve prompts that start with prefix from a Gemini cached-content handle holding prefix."""
+        self.model_name = model_name
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = min(refresh_seconds, ttl_seconds / 2)
+        key = (model_name, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        with _HANDLES_LOCK:
+            self._handle = _HANDLES.setdefault(key, _Handle())
+
+    def split(self, prompt):
+        """(model, contents) to send for prompt: the cached-content model and the rest of the prompt,
+        or (None, prompt) if the prompt doesn't start with the prefix or no handle is available."""
+        if not prompt.startswith(self.prefix):
+            return None, prompt
+        model = self._model()
+        if model is None:
+            return None, prompt
+        return model, prompt[len(self.prefix):]
+
+    def invalidate(self):
+        """Forget the handle (e.g. Gemini no longer knows it); the next call creates a new one."""
+        with self._handle.lock:
+            self._drop()
+
+    def _model(self):
+        import google.generativeai as genai
+        handle = self._handle
+        with handle.lock:
+            now = time.monotonic()
+            if handle.model is not None and now < handle.expires - self.refresh_seconds:
+                return handle.model
+            ttl = datetime.timedelta(seconds=self.ttl_seconds)
+            if handle.model is not None:
+                try:
+                    handle.cached_content.update(ttl=ttl)
+                    handle.expires = now + self.ttl_seconds
+                    return handle.model
+                except Exception as e:
+                    print(f"Could not extend Gemini context cache {handle.cached_content.name} ({e}); creating a new one.")
+                    self._drop()
+            if now < handle.retry_after:
+                return None
+            try:
+                from google.generativeai import caching
+                cached_content = caching.CachedContent.create(
+                    model=self.model_name, display_name="prettynotes-formatting-instructions",
+                    system_instruction=self.prefix, ttl=ttl)
+                handle.model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+            except Exception as e: # e.g. the instructions are below the model's minimum cacheable size
+                print(f"Gemini context cache unavailable for {self.model_name} ({e}); sending the full prompt with each chunk.")
+                handle.retry_after = now + CONTEXT_CACHE_RETRY_SECONDS
+                return None
+            handle.cached_content = cached_content
+            handle.expires = now + self.ttl_seconds
+            tokens = getattr(getattr(cached_content, "usage_metadata", None), "total_token_count", None)
+            print(f"Cached formatting instructions as {cached_content.name}" + (f" ({tokens} tokens)." if tokens else "."))
+            return handle.model
+
+    def _drop(self):
+        self._handle.cached_content = None
+        self._handle.model = None
+        self._handle.expires = 0.0
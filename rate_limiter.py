@@ -0,0 +1,165 @@
+# Client-side token-bucket rate limiting for Gemini calls.
+# Every thread, and through SQLite every process on the machine (Gradio workers, batch runs), draws
+# from one requests-per-minute and one tokens-per-minute budget, instead of each caller finding the
+# quota through 429s and retrying on its own schedule. Callers waiting for quota in a process are
+# served round-robin by user, so one large upload can't hold everyone else back.
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from outline_cache import CACHE_DIR
+
+REQUESTS_PER_MINUTE = int(os.getenv("PRETTYNOTES_GEMINI_RPM", "2000")) # 0 = no limit
+TOKENS_PER_MINUTE = int(os.getenv("PRETTYNOTES_GEMINI_TPM", "4000000")) # Prompt tokens; 0 = no limit
+SHARED_RATE_LIMIT = os.getenv("PRETTYNOTES_RATE_LIMIT_SHARED", "1") != "0" # Coordinate processes through SQLite
+MAX_WAIT_SLICE = 1.0 # Waiters re-check at least this often; other processes may take or return quota meanwhile
+
+
+def default_rate_limit_path():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, "rate_limits.sqlite3")
+
+
+def _take(levels, amounts, capacities, now):
+    """Refill each bucket for the time since it was last touched, then debit all of them or none.
+
+    levels: {name: (level, updated)}, updated in place. Returns 0 if debited, else seconds until every bucket has enough.
+    """
+    refilled = {}
+    for name in amounts:
+        level, updated = levels.get(name, (capacities[name], now))
+        refilled[name] = min(capacities[name], level + max(0.0, now - updated) * capacities[name] / 60)
+    wait = max((amounts[name] - refilled[name]) * 60 / capacities[name] for name in amounts)
+    if wait <= 0:
+        for name in amounts:
+            refilled[name] -= amounts[name]
+    for name in amounts:
+        levels[name] = (refilled[name], now)
+    return max(0.0, wait)
+
+
+class _MemoryBuckets:
+    """Bucket levels for this process only (callers hold the limiter's lock)."""
+    def __init__(self):
+        self._levels = {}
+
+    def take(self, amounts, capacities):
+        return _take(self._levels, amounts, capacities, time.time())
+
+
+class _SqliteBuckets:
+    """Bucket levels in SQLite, so every process using the same file shares one budget."""
+    def __init__(self, path):
+        self.path = path
+        # Autocommit mode so take() can open an IMMEDIATE transaction itself
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " name TEXT PRIMARY KEY,"
+            " level REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+
+    def take(self, amounts, capacities):
+        # IMMEDIATE takes the write lock up front: two processes can't both spend the same quota
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ",".join("?" * len(amounts))
+            levels = {
+                name: (level, updated)
+                for name, level, updated in self._conn.execute(
+                    f"SELECT name, level, updated FROM rate_buckets WHERE name IN ({placeholders})", list(amounts))
+            }
+            wait = _take(levels, amounts, capacities, time.time()) # Wall clock: monotonic clocks differ between processes
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rate_buckets (name, level, updated) VALUES (?, ?, ?)",
+                [(name, level, updated) for name, (level, updated) in levels.items()],
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE, shared_path=None, scope="gemini"):
+        """Requests and tokens per minute for one quota (scope, e.g. the model name).
+
+        With shared_path, the budget is shared with every other process using that SQLite file.
+        """
+        self.capacities = {}
+        if requests_per_minute > 0:
+            self.capacities[f"{scope}:requests"] = requests_per_minute
+        if tokens_per_minute > 0:
+            self.capacities[f"{scope}:tokens"] = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._buckets = _SqliteBuckets(shared_path) if shared_path else _MemoryBuckets()
+        self._cond = threading.Condition()
+        self._waiting = OrderedDict() # user -> deque of tickets; the first user is served next
+        self._tickets = itertools.count()
+
+    def acquire(self, tokens, user=None, on_wait=None):
+        """Block until one request of `tokens` prompt tokens fits the budget; returns the seconds waited.
+
+        on_wait(seconds) is called once, with an estimate, if the caller has to wait.
+        """
+        if not self.capacities:
+            return 0.0
+        amounts = {
+            name: 1 if name.endswith(":requests") else min(tokens, capacity) # A prompt over the whole budget still goes, alone
+            for name, capacity in self.capacities.items()
+        }
+        ticket = next(self._tickets)
+        start_time = time.monotonic()
+        reported = False
+        with self._cond:
+            self._waiting.setdefault(user, deque()).append(ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._is_next(user, ticket):
+                        wait = self._buckets.take(amounts, self.capacities)
+                        if not wait:
+                            self._served(user)
+                            return time.monotonic() - start_time
+                    if on_wait is not None and not reported:
+                        reported = True
+                        on_wait(self._estimate_wait(user, ticket, wait))
+                    self._cond.wait(timeout=min(wait or MAX_WAIT_SLICE, MAX_WAIT_SLICE))
+            except BaseException:
+                self._waiting[user].remove(ticket)
+                if not self._waiting[user]:
+                    del self._waiting[user]
+                self._cond.notify_all()
+                raise
+
+    def waiting(self):
+        """Callers currently waiting for quota in this process."""
+        with self._cond:
+            return sum(len(tickets) for tickets in self._waiting.values())
+
+    def _is_next(self, user, ticket):
+        first_user = next(iter(self._waiting))
+        return first_user == user and self._waiting[user][0] == ticket
+
+    def _served(self, user):
+        """Round-robin: after one request, a user goes to the back of the line."""
+        self._waiting[user].popleft()
+        if self._waiting[user]:
+            self._waiting.move_to_end(user)
+        else:
+            del self._waiting[user]
+        self._cond.notify_all()
+
+    def _estimate_wait(self, user, ticket, bucket_wait):
+        """Rough seconds until this ticket is served: the current deficit plus one request interval per caller ahead."""
+        users = list(self._waiting)
+        own_position = list(self._waiting[user]).index(ticket)
+        ahead = users.index(user) + own_position * len(users)
+        interval = 60 / self.requests_per_minute if self.requests_per_minute > 0 else 0.0
+        return (bucket_wait or 0.0) + ahead * interval
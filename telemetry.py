@@ -0,0 +1,203 @@
+# Per-stage timing for conversions. The whole conversion and each stage in it (upload, extraction, chunking, every LLM call, the
+# preservation check, highlighting, DOCX save) is timed on the monotonic clock and recorded in
+# Prometheus counters and histograms. app.py serves them as text from /metrics, next to the Gradio UI.
+# With OTEL_EXPORTER_OTLP_ENDPOINT set (e.g. http://localhost:4318) and the OpenTelemetry SDK
+# installed, every stage is also exported as a span to that collector.
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ('conversion', 'upload', 'extraction', 'chunking', 'llm_call', 'preservation', 'highlighting', 'docx_save')
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0) # Seconds
+OTEL_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "prettynotes")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8" # Prometheus text exposition format
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {} # labels -> [bucket counts (not cumulative), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            counts[next(i for i, bound in enumerate(self.buckets) if value <= bound)] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("prettynotes_stage_seconds", "Time spent in each conversion stage.", ("stage",))
+STAGE_ERRORS = Counter("prettynotes_stage_errors_total", "Conversion stages that ended with an exception.", ("stage",))
+LLM_CALLS = Counter("prettynotes_llm_calls_total", "Model calls by the backend that answered and outcome.", ("backend", "outcome"))
+CONVERSIONS = Counter("prettynotes_conversions_total", "Finished conversions by outcome.", ("outcome",))
+METRICS = [STAGE_SECONDS, STAGE_ERRORS, LLM_CALLS, CONVERSIONS]
+
+
+def render_metrics():
+    """All metrics in the Prometheus text format, for GET /metrics."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+_tracer = None
+_tracer_ready = False
+_tracer_lock = threading.Lock()
+
+
+def _get_tracer():
+    """OpenTelemetry tracer exporting to OTEL_EXPORTER_OTLP_ENDPOINT, or None if that isn't set up."""
+    global _tracer, _tracer_ready
+    if _tracer_ready:
+        return _tracer
+    with _tracer_lock:
+        if _tracer_ready:
+            return _tracer
+        if OTEL_ENDPOINT:
+            try:
+                from opentelemetry import trace
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            except ImportError:
+                print("OTEL_EXPORTER_OTLP_ENDPOINT is set, but span export needs "
+                      "`pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http`; exporting nothing.")
+            else:
+                provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter())) # Reads the endpoint from the environment
+                trace.set_tracer_provider(provider)
+                _tracer = trace.get_tracer("prettynotes")
+                print(f"Exporting conversion spans to {OTEL_ENDPOINT}.")
+        _tracer_ready = True
+        return _tracer
+
+
+@contextmanager
+def stage_span(stage, **attributes):
+    """Time the block as one `stage` (see STAGES); yields a dict more span attributes can be added to."""
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage {stage!r}; expected one of {', '.join(STAGES)}.")
+    tracer = _get_tracer()
+    start_time = time.monotonic()
+    if tracer is None:
+        try:
+            yield attributes
+        except BaseException:
+            STAGE_ERRORS.inc(stage=stage)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.monotonic() - start_time, stage=stage)
+        return
+    with tracer.start_as_current_span(f"prettynotes.{stage}") as otel_span:
+        try:
+            yield attributes
+        except BaseException:
+            STAGE_ERRORS.inc(stage=stage)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.monotonic() - start_time, stage=stage)
+            otel_span.set_attributes({key: value for key, value in attributes.items() if value is not None})
+
+
+def record_stage(stage, seconds, **attributes):
+    """Record a stage timed elsewhere, e.g. one spread over many small steps (see Stopwatch)."""
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage {stage!r}; expected one of {', '.join(STAGES)}.")
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    tracer = _get_tracer()
+    if tracer is not None:
+        end_ns = time.time_ns()
+        otel_span = tracer.start_span(f"prettynotes.{stage}", start_time=end_ns - int(seconds * 1e9),
+                                      attributes={key: value for key, value in attributes.items() if value is not None})
+        otel_span.end(end_time=end_ns)
+
+
+def carry_context(fn):
+    """Wrap fn to run in the calling thread's trace context, so spans from worker threads join the conversion's trace."""
+    if _get_tracer() is None:
+        return fn
+    from opentelemetry import context
+    parent = context.get_current()
+
+    def run(*args, **kwargs):
+        token = context.attach(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            context.detach(token)
+    return run
+
+
+class Stopwatch:
+    """Total time spent inside `with stopwatch:` blocks, for a stage made of many tiny steps."""
+    def __init__(self):
+        self.seconds = 0.0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds += time.monotonic() - self._start
+
+    def iterate(self, iterable):
+        """Yield from iterable, timing only the work of producing each item (not the caller's work in between)."""
+        iterator = iter(iterable)
+        while True:
+            with self:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
@@ -0,0 +1,77 @@
+# Chunks whose outline comes back empty must be retried and, failing that, kept as raw text.
+# The converter is built without __init__ (which configures Gemini), as benchmarks/bench_docx_writer.py does.
+import threading
+
+import new_v4
+from model_backends import BackendError, BackendRouter, FunctionBackend
+from new_v4 import EVENT_CHUNK_DONE, EVENT_RETRY, GeminiContentPreservingConverter, LocalOutliner
+from outline_cache import OutlineCache
+
+CHUNK = "The mitochondria is the powerhouse of the cell. It produces ATP through respiration. Cells need energy to survive."
+
+
+def make_converter(generate, backend_name='stub'):
+    converter = GeminiContentPreservingConverter.__new__(GeminiContentPreservingConverter)
+    converter.engine = 'gemini'
+    converter.local_outliner = LocalOutliner()
+    converter.outline_cache = None
+    converter.max_concurrent_chunks = 1
+    converter._call_context = threading.local()
+    converter.router = BackendRouter([FunctionBackend(backend_name, generate)])
+    return converter
+
+
+def convert(converter):
+    events = []
+    outlines = converter.format_chunks([CHUNK], CHUNK, emit=lambda event_type, **fields: events.append({'type': event_type, **fields}))
+    return outlines, events
+
+
+def events_of(events, event_type):
+    return [event for event in events if event['type'] == event_type]
+
+
+def test_empty_outline_is_retried_then_kept_as_raw_text():
+    prompts = []
+    converter = make_converter(lambda prompt, chunk_num: prompts.append(prompt) or "")
+    outlines, events = convert(converter)
+    assert len(prompts) == 1 + new_v4.PRESERVATION_RETRIES_PER_CHUNK
+    assert "mitochondria is the powerhouse" in outlines[0]
+    assert events_of(events, EVENT_RETRY)[0]['outcome'] == 'raw_text'
+    assert events_of(events, EVENT_CHUNK_DONE)[0]['engine'] == 'raw'
+
+
+def test_empty_outline_falls_back_to_raw_text_without_retry_budget(monkeypatch):
+    monkeypatch.setattr(new_v4, 'PRESERVATION_RETRY_BUDGET', 0)
+    converter = make_converter(lambda prompt, chunk_num: "")
+    outlines, events = convert(converter)
+    assert "Cells need energy to survive" in outlines[0]
+    assert events_of(events, EVENT_CHUNK_DONE)[0]['engine'] == 'raw'
+
+
+def test_backend_error_falls_back_to_raw_text():
+    def fail(prompt, chunk_num):
+        raise BackendError("stub: HTTP 500 Internal Server Error")
+    outlines, events = convert(make_converter(fail))
+    assert "It produces ATP through respiration" in outlines[0]
+    assert events_of(events, EVENT_CHUNK_DONE)[0]['engine'] == 'raw'
+
+
+def test_good_outline_is_kept_and_labelled_with_its_backend():
+    converter = make_converter(lambda prompt, chunk_num: "1. " + CHUNK, backend_name='deepseek')
+    outlines, events = convert(converter)
+    assert outlines == ["1. " + CHUNK]
+    assert not events_of(events, EVENT_RETRY)
+    assert events_of(events, EVENT_CHUNK_DONE)[0]['engine'] == 'deepseek'
+
+
+def test_cached_outline_keeps_its_backend_label(tmp_path):
+    outline_cache = OutlineCache(str(tmp_path / "outlines.sqlite3"))
+    for generate in (lambda prompt, chunk_num: "1. " + CHUNK, lambda prompt, chunk_num: ""):
+        converter = make_converter(generate, backend_name='deepseek')
+        converter.outline_cache = outline_cache
+        converter.cache_version = "test"
+        outlines, events = convert(converter)
+    [done] = events_of(events, EVENT_CHUNK_DONE)
+    assert outlines == ["1. " + CHUNK]
+    assert done['cached'] and done['engine'] == 'deepseek'
@@ -0,0 +1,21 @@
+# Settings placed only in .env must reach the modules that read them at import time.
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS = {"PRETTYNOTES_ENGINE": "local", "PRETTYNOTES_MAX_CONCURRENT_CHUNKS": "1", "PRETTYNOTES_METRICS": "0"}
+
+
+def test_app_reads_settings_from_dotenv(tmp_path):
+    (tmp_path / ".env").write_text("".join(f"{name}={value}\n" for name, value in SETTINGS.items()))
+    env = {name: value for name, value in os.environ.items() if name not in SETTINGS}
+    # Run from tmp_path, where load_dotenv() finds the .env (python -c has no script directory to search from)
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); import app, new_v4; "
+            "print(new_v4.OUTLINE_ENGINE, new_v4.MAX_CONCURRENT_CHUNKS, app.METRICS_ENABLED)")
+    output = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, check=True).stdout
+    assert output.split()[-3:] == ["local", "1", "False"]
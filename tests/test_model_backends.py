@@ -0,0 +1,100 @@
+# BackendRouter failover and circuit breaking, with function backends standing in for the models.
+import json
+import threading
+
+import pytest
+
+from model_backends import BREAKER_FAILURE_THRESHOLD, BackendError, BackendRouter, ClientError, FunctionBackend, load_backends
+
+
+class Flaky:
+    """generate() for a FunctionBackend that raises `error` for the next `failures` calls, then answers."""
+    def __init__(self, name, failures=0, error=BackendError):
+        self.name = name
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, prompt, chunk_num):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise self.error(f"{self.name} failed")
+        return f"outline from {self.name}"
+
+
+def call(router):
+    try:
+        return router.generate("prompt")[0]
+    except Exception as e:
+        return e
+
+
+def test_single_backend_keeps_serving_through_a_failure_burst():
+    gemini = Flaky('gemini', failures=BREAKER_FAILURE_THRESHOLD * 2)
+    router = BackendRouter([FunctionBackend('gemini', gemini)])
+    results = [call(router) for _ in range(BREAKER_FAILURE_THRESHOLD * 2 + 2)]
+    assert all(isinstance(result, BackendError) for result in results[:BREAKER_FAILURE_THRESHOLD * 2])
+    assert results[-2:] == ["outline from gemini"] * 2
+    assert gemini.calls == len(results) # Every call reached the backend, open circuit or not
+    assert router.metrics()['gemini']['breaker'] == 'closed'
+
+
+def test_single_backend_serves_concurrent_callers_while_open():
+    gemini = Flaky('gemini', failures=BREAKER_FAILURE_THRESHOLD)
+    router = BackendRouter([FunctionBackend('gemini', gemini)])
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        call(router)
+    assert router.metrics()['gemini']['breaker'] == 'open'
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(call(router))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["outline from gemini"] * 4
+
+
+def test_failing_backend_is_skipped_while_another_is_healthy():
+    gemini = Flaky('gemini', failures=100)
+    other = Flaky('other')
+    router = BackendRouter([FunctionBackend('gemini', gemini), FunctionBackend('other', other)])
+    results = [call(router) for _ in range(10)]
+    assert results == ["outline from other"] * 10
+    assert router.metrics()['gemini']['breaker'] == 'open'
+    assert gemini.calls == BREAKER_FAILURE_THRESHOLD
+
+
+def test_client_errors_fail_over_without_opening_the_circuit():
+    gemini = Flaky('gemini', failures=10, error=ClientError)
+    other = Flaky('other')
+    router = BackendRouter([FunctionBackend('gemini', gemini), FunctionBackend('other', other)])
+    results = [call(router) for _ in range(10)]
+    assert results == ["outline from other"] * 10
+    assert router.metrics()['gemini']['breaker'] == 'closed'
+    assert gemini.calls == 10
+
+
+def test_exceptions_with_a_4xx_code_count_as_client_errors():
+    class InvalidArgument(Exception): # Like google.api_core.exceptions.InvalidArgument
+        code = 400
+    gemini = Flaky('gemini', failures=10, error=InvalidArgument)
+    router = BackendRouter([FunctionBackend('gemini', gemini)])
+    for _ in range(10):
+        call(router)
+    assert router.metrics()['gemini']['breaker'] == 'closed'
+
+
+def test_load_backends_passes_llama_settings(tmp_path):
+    path = tmp_path / "backends.json"
+    path.write_text(json.dumps([{"name": "llama", "type": "llama_cpp", "model_path": "model.gguf",
+                                 "n_ctx": 8192, "n_batch": 256, "n_threads": 2, "max_concurrent": 2}]))
+    [backend] = load_backends(str(path), llama_model_path=None)
+    assert (backend.n_ctx, backend.n_batch, backend.n_threads, backend.max_concurrent) == (8192, 256, 2, 2)
+
+
+def test_load_backends_rejects_reserved_names(tmp_path):
+    path = tmp_path / "backends.json"
+    path.write_text(json.dumps([{"name": "local", "type": "llama_cpp", "model_path": "model.gguf"}]))
+    with pytest.raises(ValueError):
+        load_backends(str(path), llama_model_path=None)
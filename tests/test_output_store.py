@@ -0,0 +1,36 @@
+# OutputStore: conversions write privately, and only published entries are served.
+import os
+
+from output_store import OutputStore
+
+
+def write(path, text="docx"):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_published_output_is_served(tmp_path):
+    store = OutputStore(str(tmp_path))
+    path = store.output_path("key", "notes.docx")
+    write(path)
+    assert store.get("key", "notes.docx") is None
+    final_path = store.publish("key", path)
+    assert store.get("key", "notes.docx") == final_path
+    assert not any(name.startswith(".converting-") for name in os.listdir(tmp_path / "key"))
+
+
+def test_concurrent_conversions_get_separate_paths(tmp_path):
+    store = OutputStore(str(tmp_path))
+    assert store.output_path("key", "notes.docx") != store.output_path("key", "notes.docx")
+
+
+def test_detached_output_leaves_nothing_in_the_store(tmp_path):
+    store = OutputStore(str(tmp_path))
+    path = store.output_path("key", "notes.docx")
+    write(path, "empty outline")
+    detached_path = store.detach(path)
+    with open(detached_path) as f:
+        assert f.read() == "empty outline"
+    assert os.path.basename(detached_path) == "notes.docx"
+    assert os.listdir(tmp_path / "key") == []
+    assert store.get("key", "notes.docx") is None
@@ -0,0 +1,71 @@
+# Correctness of the rolling-hash preservation checker: known edit cases, and randomized outlines
+# compared with a brute-force shingle matcher. benchmarks/bench_preservation.py times it.
+import random
+import re
+
+from preservation import OUTLINE_MARKER, SHINGLE_WORDS, check_preservation
+
+TEXT = "The mitochondria is the powerhouse of the cell. It produces ATP through respiration. Cells need energy to survive."
+
+
+def brute_force_coverage(original, outline, k=SHINGLE_WORDS):
+    """Reference: every k-word window of the original looked up in the set of the outline's windows."""
+    a = re.findall(r'\w+', original.lower())
+    b = re.findall(r'\w+', OUTLINE_MARKER.sub('', outline).lower())
+    if not a:
+        return 1.0
+    k = max(1, min(k, len(a), len(b) or 1))
+    windows = {tuple(b[j:j + k]) for j in range(len(b) - k + 1)}
+    covered = [False] * len(a)
+    for i in range(len(a) - k + 1):
+        if tuple(a[i:i + k]) in windows:
+            covered[i:i + k] = [True] * k
+    return sum(covered) / len(a)
+
+
+def test_identical_text_is_fully_covered():
+    report = check_preservation(TEXT, TEXT)
+    assert report.coverage == 1.0
+    assert not report.missing_spans and not report.inserted_spans
+
+
+def test_outline_markers_are_ignored():
+    outline = "1. The mitochondria is the powerhouse of the cell.\n1.a. It produces ATP through respiration.\n|-- Cells need energy to survive."
+    report = check_preservation(TEXT, outline)
+    assert report.coverage == 1.0
+    assert not report.inserted_spans
+
+
+def test_dropped_sentence_is_missing():
+    report = check_preservation(TEXT, "The mitochondria is the powerhouse of the cell. Cells need energy to survive.")
+    assert report.missing_spans == ["It produces ATP through respiration"]
+
+
+def test_invented_sentence_is_inserted():
+    report = check_preservation(TEXT, TEXT + " This sentence was invented.")
+    assert report.coverage == 1.0
+    assert report.inserted_spans == ["This sentence was invented"]
+
+
+def test_misspelled_word_is_missing_and_inserted():
+    report = check_preservation(TEXT, TEXT.replace("powerhouse", "powrehouse"))
+    assert report.missing_spans == ["powerhouse"]
+    assert report.inserted_spans == ["powrehouse"]
+
+
+def test_short_and_empty_texts():
+    assert check_preservation("", "anything").coverage == 1.0
+    assert check_preservation("Short note", "").coverage == 0.0
+    assert check_preservation("Short note", "short NOTE").coverage == 1.0
+
+
+def test_coverage_matches_brute_force():
+    rng = random.Random(17)
+    for _ in range(2000):
+        original = " ".join(rng.choice("abcdef") for _ in range(rng.randint(0, 30)))
+        edited = [w for w in original.split() if rng.random() > 0.1]
+        for _ in range(rng.randint(0, 3)):
+            edited.insert(rng.randint(0, len(edited)), rng.choice("abcdefg"))
+        outline = " ".join(edited)
+        expected = brute_force_coverage(original, outline)
+        assert abs(check_preservation(original, outline).coverage - expected) < 1e-12, (original, outline)